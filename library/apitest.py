@@ -17,9 +17,14 @@
 #       - 2018/7/27 18:13  add by wangxinae
 #
 # *********************************************************************
+import time
+
 from library.basesheetdata import OperateExcel
-from library.conf import settings
+from library.executor import SheetExecutor
 from library.log import log
+from library.plan import compile_sheet
+from library.requestlog import request_context
+from library.resultstore import result_store
 from library.sessionmethod import SessionMethod
 from library.utils import print_timer_context
 
@@ -33,6 +38,13 @@ class Api(OperateExcel):
         self.file_name = file_name
         self.sheet_name = sheet_name
 
+    @property
+    def plans(self):
+        """
+        :return: sheet编译之后的RowPlan列表
+        """
+        return compile_sheet(self.file_name, self.sheet_name)
+
     def api(self):
         """
         + 说明：
@@ -62,107 +74,44 @@ class Api(OperateExcel):
 
            4.除上述外的其他情况，判断测试结果为fail。
 
+           以上规则在编译sheet的时候转换成library.matcher.Matcher，每行测试用例只返回一个结果。
+
+        + 执行顺序：
+              配置API_CONCURRENCY大于1的时候互相独立的测试用例会并发执行，参见library.executor，返回结果依旧按照seq排序。
+
+        + 重新执行：
+              RERUN_MODE为failed-only/changed-only的时候只执行上一次失败/内容发生变化的行，参见library.resultstore。
+
         :return: 返回每张sheet中各个测试例结果的列表
 
         """
-        # noinspection PyTypeChecker
-        arguments = zip(self.seqs, self.names, self.urls, self.data, self.methods, self.codes, self.error_codes)
         res = []
-        for seq, name, url, data, method, code, error_code in arguments:
-            full_url = settings.base_url + url
-            with print_timer_context(f'{seq} {name}'):
-                api = SessionMethod(full_url, data, seq)
-                stat = {'status': None}
-                request = {
-                    "post": api.post, "get": api.get, "put": api.put, "delete": api.delete, "head": api.head,
-                    "patch": api.patch, "option": api.option, "postuser": api.post_user,
-                    "getuser": api.get_user,
-                    "putuser": api.put_user, "deleteuser": api.delete_user, "postadmin": api.post_admin,
-                    "getadmin": api.get_admin,
-                    "putadmin": api.put_admin, "deleteadmin": api.delete_admin,
-                    "postnologin": api.post_no_login, "getnologin": api.get_no_login,
-                    "putnologin": api.put_no_login, "deletenologin": api.delete_no_login
-                }
-                if method not in request:
-                    log('interface test method is error', level='info')
-                else:
-                    stat = request[method]()
-                # 下面代码作用为根据返回结果判断测试是否通过
-                if code != "" and stat["status"] == code:
-                    # 使用状态码code[]来判断的情况
-                    log(
-                        f'\n[结果]:\n'
-                        f'> [Except Code: {int(code)} ] | [Actual Code: {stat["status"]}] TestCase {name}({seq}) is '
-                        f'Passed',
-                        level='info')
-                    # log(f'[Match Code: {code} is OK!] TestCase {name} {seq} is Passed', level='info')
-                    res.append(1)
-                elif code == "" and error_code != "" and stat["status"] != 0:
-                    # 使用状态码error_code[]来判断的情况,有一种特殊情况，预期不能创建成功的接口，在测试中创建成功会返回代码0，例如：
-                    # {'status': 0, 'addErrors': None, 'updateErrors': None, 'delErrors': None}
-                    for key in stat:
-                        if (key == "errors" or key == "addErrors" or key == "delErrors" or key == "updateErrors") \
-                                and isinstance(stat[key], list):
-                            # 用于user->“组织机构用户组批量操作”or“批量删除用户组”测试判断
-                            # {'status': 7, 'errors': [{'id': 14, 'status': 1}, {'id': 7, 'status': 163}]}
-                            for d in range(len(stat[key])):
-                                # 遍历关键字为"errors"or"addErrors"or"delErrors"or"updateErrors"的字典所对应值的列表，这里列表所对应
-                                # 的元素个数是变化的
-                                if stat[key][d].get("status") == error_code \
-                                        or stat[key][d].get("code") == error_code:
-                                    # 列表中每一个元素都是字典类型，取字典中关键字"status"对应的错误码，用来做判断
-                                    log(f'[Match ErrorCode: {error_code} is OK!] TestCase {seq} is Passed',
-                                        level='info')
-                                    res.append(1)
-                                    # 如果错误码和预期一致，目前遇到的返回码只涉及到关键字"errors"or"addErrors"or"delErrors"
-                                    # or"updateErrors"中的一种，所以一旦找到就退出循环
-                                    break
-                            else:
-                                log(f'[Not Match ErrorCode: {error_code}] TestCase {seq} is Failed',
-                                    level='error')
-                                res.append(0)
-                                # 整个错误码对应列表中的字典元素都和预期错误码不一致，记为测试fail
-                        elif (key == 'result') and isinstance(stat[key], dict):
-                            # 用于user->"用户账号批量导入"测试判断
-                            # {"status":4,"result":{"count":4,"errors":[{"index":5,"code":251},{"index":6,"code":252},
-                            # {"index":7,"code":252},{"index":8,"code":252}]}}
-                            if stat[key]['count'] == error_code or \
-                                    ('errors' in stat[key] and error_code == 'errors'):
-                                # 判断count或者errors是否与错误检查点一致
-                                log(f'[Match ErrorCode: {error_code} is OK!] TestCase {seq} is Passed',
-                                    level='info')
-                                res.append(1)
-                            else:
-                                for b in range(len(stat[key]['errors'])):
-                                    # 遍历关键字为"errors"的字典所对应值的列表，这里列表所对应的元素个数是变化的
-                                    if stat[key]['errors'][b].get("index") == error_code \
-                                            or stat[key]['errors'][b].get("code") == error_code:
-                                        # 列表中每一个元素都是字典类型，取字典中关键字"index"或者“code”对应的错误码，用来做判断
-                                        log(f'[Match ErrorCode: {error_code} is OK!] TestCase {seq} is Passed',
-                                            level='info')
-                                        res.append(1)
-                                        # 如果错误码和预期一致，目前遇到的返回码只涉及到关键字"code"or"index"中的一种，
-                                        # 所以一旦找到就退出循环
-                                        break
-                                else:
-                                    log(f'[Not Match ErrorCode: {error_code}] TestCase {seq} is Failed',
-                                        level='error')
-                                    res.append(0)
-                                    # 整个错误码对应列表中的字典元素都和预期错误码不一致，记为测试fail
-                        elif (key == 'result') and not isinstance(stat[key], dict):
-                            # org->组织机构导入-IP格式不正确{"status":3,"result":null}
-                            log(f'[Not Match ErrorCode: {error_code}] TestCase {seq} is Failed',
-                                level='error')
-                            res.append(0)
-
-                elif code == "" and stat["status"] == 0:
-                    log(f'[The Reason for TestCase {seq} Failure is function problem', level='error')
-                    res.append(0)
-                else:
-                    log(
-                        f'\n[结果]:\n'
-                        f"> [Except Code: {str(code).strip('.0')} ] | [Actual Code: {stat['status']}] "
-                        f"TestCase {name}({seq}) is Failed",
-                        level='error')
-                    res.append(0)
+        plans = result_store.select_rows(self.file_name, self.sheet_name, self.plans)
+        for row_res in SheetExecutor().run(plans, self.run_row):
+            res.extend(row_res)
+        result_store.flush()
         return res
+
+    def run_row(self, plan):
+        """
+        + 说明：
+            执行sheet中的一行测试用例，判断逻辑参见api()
+
+        :param plan: library.plan.RowPlan
+        :return: 该行测试用例结果的列表，只有一个元素，1表示通过，0表示失败
+        """
+        seq, name = plan.seq, plan.name
+        start_timestamp = time.time()
+        with print_timer_context(f'{seq} {name}'), request_context(sheet=self.sheet_name, seq=seq):
+            stat = {'status': None}
+            if plan.handler is None:
+                log('interface test method is error', level='info')
+            else:
+                stat = plan.handler(SessionMethod.from_plan(plan))
+            # 根据编译好的预期检查点判断测试是否通过，参见library.matcher.compile_expectation
+            verdict = plan.matcher.match(stat)
+            log('\n[结果]:\n> %s TestCase %s(%s) is %s', level='info' if verdict.passed else 'error',
+                args=(verdict.reason, name, seq, 'Passed' if verdict.passed else 'Failed'))
+        result_store.record_row(self.file_name, self.sheet_name, plan, verdict.passed, time.time() - start_timestamp,
+                                stat)
+        return [int(verdict.passed)]
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# asyncclient.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/20 14:05  add by yanwh
+#
+# *********************************************************************
+"""
+module doc string
+基于asyncio(aiohttp)的http客户端，接口与client.HttpSession保持一致：
+    + AsyncHttpSession：协程版本，request(method, url, name=None, **kwargs)，同样记录meta_data，
+      返回requests.Response对象，连接异常的时候返回带error的ApiResponse；
+      并发请求的时候每个请求的meta_data保存在各自的response.meta_data中，self.meta_data为最近完成的请求
+    + SyncHttpSession：同步封装，在后台线程的事件循环中运行AsyncHttpSession，原有测试用例可以直接替换使用
+
+单个进程中通过request_many可以对同一台设备同时发起成千上万个接口请求，并发数由连接池大小limit控制。
+"""
+import asyncio
+import datetime
+import threading
+import time
+
+import requests
+from requests import Request
+from requests.cookies import cookiejar_from_dict
+from requests.exceptions import ConnectionError, InvalidURL, RequestException, Timeout
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from library.client import ApiResponse, HttpSession, placeholder_record, request_listeners
+from library.exceptions import ImproperlyConfigured
+from library.log import log, log_enabled
+from library.pacing import pacer
+from library.requestlog import request_sink
+from library.utils import build_url
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp为可选依赖，只有使用异步客户端的时候才需要安装
+    aiohttp = None
+
+
+def _build_response(method, resp, body, elapsed, request_kwargs):
+    """
+    将aiohttp的ClientResponse转换成requests.Response，使得get_req_resp_record以及测试用例中的断言无需修改
+
+    :param method: 请求方法
+    :param resp: aiohttp.ClientResponse
+    :param body: 响应内容
+    :param elapsed: 请求耗时(秒)
+    :param request_kwargs: 请求参数，用于还原请求体
+    :return: requests.Response
+    """
+    response = requests.Response()
+    response.status_code = resp.status
+    response.reason = resp.reason
+    response.url = str(resp.url)
+    response.headers = CaseInsensitiveDict(resp.headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.cookies = cookiejar_from_dict({key: morsel.value for key, morsel in resp.cookies.items()})
+    response.elapsed = datetime.timedelta(seconds=elapsed)
+    response._content = body
+    response.request = Request(method, str(resp.request_info.url), headers=dict(resp.request_info.headers),
+                               data=request_kwargs.get('data'), json=request_kwargs.get('json')).prepare()
+    return response
+
+
+class AsyncHttpSession(object):
+    """
+    + 说明：
+        基于aiohttp的异步HttpSession，所有请求共用一个带连接池的aiohttp.ClientSession，
+        cookies保存在允许ip地址的CookieJar中（设备通过ip访问）。
+    """
+
+    init_meta_data = HttpSession.init_meta_data
+    get_req_resp_record = HttpSession.get_req_resp_record
+
+    def __init__(self, base_url=None, limit=100, limit_per_host=0):
+        """
+        :param base_url: 接口的base url
+        :param limit: 连接池中连接总数上限，同时也是并发请求数上限
+        :param limit_per_host: 单个host的连接数上限，0表示不限制
+        """
+        if aiohttp is None:
+            raise ImproperlyConfigured('AsyncHttpSession依赖aiohttp，请先执行pip install aiohttp')
+        self.base_url = base_url if base_url else ""
+        self.headers = {}
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session = None
+        self.init_meta_data()
+
+    @property
+    def session(self):
+        """aiohttp.ClientSession需要在事件循环中创建，因此延迟到第一次请求的时候"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, ssl=False)
+            self._session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.CookieJar(unsafe=True))
+        return self._session
+
+    @property
+    def cookies(self):
+        """
+        :return: 当前会话的cookies
+        """
+        return self.session.cookie_jar
+
+    async def request(self, method, url, name=None, **kwargs):
+        """
+        参数与返回值同client.HttpSession.request
+        """
+        # asyncio.gather并发的请求不能共用self.meta_data，每个请求单独记录
+        meta_data = {"name": name, "data": [placeholder_record()]}
+        meta_data["data"][0]["request"]["method"] = method
+        meta_data["data"][0]["request"]["url"] = url
+        kwargs.setdefault("timeout", 120)
+        meta_data["data"][0]["request"].update(kwargs)
+
+        url = build_url(self.base_url, url)
+
+        delay = pacer.delay(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        start_timestamp = time.time()
+        response = await self._send_request_safe_mode(method, url, **kwargs)
+        response_time_ms = round((time.time() - start_timestamp) * 1000, 2)
+        pacer.feedback(url, response_time_ms, response.status_code)
+        content_size = len(response.content or "")
+
+        meta_data["stat"] = {
+            "response_time_ms": response_time_ms,
+            "elapsed_ms": response.elapsed.microseconds / 1000.0,
+            "content_size": content_size
+        }
+        meta_data["data"] = [
+            self.get_req_resp_record(resp_obj)
+            for resp_obj in response.history + [response]
+        ]
+        response.meta_data = self.meta_data = meta_data
+        if log_enabled('debug'):
+            for record in meta_data["data"]:
+                record.log_details()
+
+        error = None
+        try:
+            response.raise_for_status()
+        except RequestException as e:
+            error = e
+            log(u"{exception}".format(exception=str(e)), level='error')
+        else:
+            log(
+                """status_code: {}, response_time(ms): {} ms, response_length: {} bytes\n""".format(
+                    response.status_code,
+                    response_time_ms,
+                    content_size
+                ),
+            )
+
+        request_sink.record(method, url, response, response_time_ms, content_size, error)
+        for listener in request_listeners:
+            listener(name or url, method, url, response_time_ms, content_size, error)
+        return response
+
+    def _aiohttp_kwargs(self, kwargs):
+        """将requests风格的参数转换成aiohttp的参数"""
+        options = {
+            'params': kwargs.get('params'),
+            'json': kwargs.get('json'),
+            'cookies': kwargs.get('cookies'),
+            'allow_redirects': kwargs.get('allow_redirects', True),
+            'headers': dict(self.headers, **(kwargs.get('headers') or {})),
+            'timeout': aiohttp.ClientTimeout(total=kwargs['timeout'] if not isinstance(kwargs['timeout'], tuple)
+                                             else sum(kwargs['timeout'])),
+        }
+        if kwargs.get('auth'):
+            options['auth'] = aiohttp.BasicAuth(*kwargs['auth'])
+        if kwargs.get('files'):
+            form = aiohttp.FormData()
+            for field, value in (kwargs.get('data') or {}).items():
+                form.add_field(field, str(value))
+            for field, value in kwargs['files'].items():
+                if isinstance(value, (tuple, list)):
+                    form.add_field(field, value[1], filename=value[0])
+                else:
+                    form.add_field(field, value, filename=getattr(value, 'name', field))
+            options['data'] = form
+        else:
+            options['data'] = kwargs.get('data')
+        return {key: value for key, value in options.items() if value is not None}
+
+    async def _send_request_safe_mode(self, method, url, **kwargs):
+        """
+        发送请求并捕获连接相关的异常，异常语义同client.HttpSession._send_request_safe_mode
+        """
+        log("processed request:\n> %s %s\n> kwargs: %s", args=(method, url, kwargs))
+        start_timestamp = time.time()
+        try:
+            async with self.session.request(method, url, **self._aiohttp_kwargs(kwargs)) as resp:
+                body = await resp.read()
+                response = _build_response(method, resp, body, time.time() - start_timestamp, kwargs)
+                response.history = [_build_response(method, history, b'', 0, kwargs) for history in resp.history]
+                return response
+        except aiohttp.InvalidURL as ex:
+            raise InvalidURL(str(ex))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            resp = ApiResponse()
+            resp.error = Timeout(ex) if isinstance(ex, asyncio.TimeoutError) else ConnectionError(ex)
+            resp.status_code = 0  # with this status_code, content returns None
+            resp.request = Request(method, url).prepare()
+            return resp
+
+    async def request_many(self, requests_, concurrency=None):
+        """
+        + 说明：
+            并发发送多个请求
+
+        :param requests_: [(method, url, kwargs), ...]，kwargs可以包含name
+        :param concurrency: 同时进行的请求数量上限，默认为连接池大小
+        :return: 与requests_顺序一致的Response列表
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.limit or len(requests_) or 1)
+
+        async def _request(method, url, kwargs):
+            async with semaphore:
+                return await self.request(method, url, **kwargs)
+
+        return await asyncio.gather(*(_request(method, url, dict(kwargs or {})) for method, url, kwargs in requests_))
+
+    async def get(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return await self.request('GET', url, **kwargs)
+
+    async def options(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return await self.request('OPTIONS', url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return await self.request('HEAD', url, **kwargs)
+
+    async def post(self, url, data=None, json=None, **kwargs):
+        return await self.request('POST', url, data=data, json=json, **kwargs)
+
+    async def put(self, url, data=None, **kwargs):
+        return await self.request('PUT', url, data=data, **kwargs)
+
+    async def patch(self, url, data=None, **kwargs):
+        return await self.request('PATCH', url, data=data, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class SyncHttpSession(object):
+    """
+    + 说明：
+        AsyncHttpSession的同步封装，事件循环运行在后台daemon线程中，
+        接口与client.HttpSession一致(request/get/post/put/patch/delete/head/options/meta_data/close)
+    """
+
+    def __init__(self, base_url=None, **kwargs):
+        """
+        :param base_url: 接口的base url
+        :param kwargs: 传给AsyncHttpSession的参数，例如limit
+        """
+        self.async_session = AsyncHttpSession(base_url, **kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='async-http', daemon=True)
+        self._thread.start()
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @property
+    def base_url(self):
+        return self.async_session.base_url
+
+    @base_url.setter
+    def base_url(self, value):
+        self.async_session.base_url = value
+
+    @property
+    def headers(self):
+        return self.async_session.headers
+
+    @property
+    def meta_data(self):
+        return self.async_session.meta_data
+
+    @property
+    def cookies(self):
+        return self._call(self._cookies())
+
+    async def _cookies(self):
+        return self.async_session.cookies
+
+    def request(self, method, url, name=None, **kwargs):
+        return self._call(self.async_session.request(method, url, name=name, **kwargs))
+
+    def request_many(self, requests_, concurrency=None):
+        """参见AsyncHttpSession.request_many"""
+        return self._call(self.async_session.request_many(requests_, concurrency))
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('GET', url, **kwargs)
+
+    def options(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('OPTIONS', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def patch(self, url, data=None, **kwargs):
+        return self.request('PATCH', url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        if self._loop.is_running():
+            self._call(self.async_session.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -17,6 +17,155 @@
 #       - 2018/7/25 16:40  add by wangxinae
 #
 # *********************************************************************
+import os
+import threading
+from collections import OrderedDict
+
+from library.conf import settings
+from library.decorator import SingletonMeta
+
+# sheet表中各列的含义，顺序与excel中的列顺序一致
+COLUMNS = ('seq', 'name', 'precondition', 'url', 'data', 'method', 'status_code', 'code', 'error_code')
+
+
+class SheetTable(object):
+    """
+    + 说明：
+        sheet内容的列存储，每一列（不含表头）保存为一个tuple，读取的时候直接返回该tuple，不做拷贝。
+        列数不足COLUMNS的sheet使用空字符串补齐。
+    """
+    __slots__ = ('name', 'nrows', 'ncols', 'columns')
+
+    def __init__(self, sheet):
+        """
+        :param sheet: xlrd的sheet对象
+        """
+        self.name = sheet.name
+        self.nrows = sheet.nrows
+        self.ncols = sheet.ncols
+        blank = ('',) * max(sheet.nrows - 1, 0)
+        self.columns = tuple(tuple(sheet.col_values(col, start_rowx=1)) if col < sheet.ncols else blank
+                             for col in range(len(COLUMNS)))
+
+    def column(self, name):
+        """
+        :param name: 列名称，参见COLUMNS
+        :return: 该列所有测试用例的值
+        """
+        return self.columns[COLUMNS.index(name)]
+
+
+def load_workbook(file_name):
+    """
+    + 说明：
+        打开excel一次，按列读取所有sheet的内容
+
+    :param file_name: excel文件名称
+    :return: {sheet名称: SheetTable}
+    """
+    import xlrd  # 延迟导入，防止循环导入
+    book = xlrd.open_workbook(file_name, on_demand=True)
+    try:
+        return {name: SheetTable(book.sheet_by_name(name)) for name in book.sheet_names()}
+    finally:
+        book.release_resources()
+
+
+class WorkbookCache(metaclass=SingletonMeta):
+    """
+    + 说明：
+        进程内共享的excel缓存，key为excel的绝对路径，同时记录文件的mtime和size，
+        文件在运行过程中被修改之后下一次访问会重新读取。
+        缓存的单元格总数超过WORKBOOK_CACHE_MAX_CELLS时按照最近最少使用的顺序淘汰。
+
+        hits：命中缓存的次数
+        misses：首次读取excel的次数
+        reloads：excel被修改之后重新读取的次数
+        evictions：被淘汰的excel数量
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # {绝对路径: (mtime, size, cells, {sheet名称: SheetTable})}
+        self._lock = threading.RLock()
+        self.cells = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def workbook(self, file_name):
+        """
+        :param file_name: excel文件名称
+        :return: {sheet名称: SheetTable}
+        """
+        path = os.path.abspath(file_name)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[:2] == (stat.st_mtime, stat.st_size):
+                self.hits += 1
+                self._entries.move_to_end(path)
+                return entry[3]
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+                self._discard(path)
+            tables = load_workbook(path)
+            cells = sum(len(column) for table in tables.values() for column in table.columns)
+            self._entries[path] = (stat.st_mtime, stat.st_size, cells, tables)
+            self.cells += cells
+            self._evict(settings.get('WORKBOOK_CACHE_MAX_CELLS') or 0)
+            return tables
+
+    def sheet(self, file_name, sheet_name):
+        """
+        :param file_name: excel文件名称
+        :param sheet_name: sheet名称
+        :return: 对应sheet的SheetTable
+        """
+        try:
+            return self.workbook(file_name)[sheet_name]
+        except KeyError:
+            import xlrd
+            raise xlrd.XLRDError(f'No sheet named <{sheet_name!r}>')
+
+    def _discard(self, path):
+        _, _, cells, _ = self._entries.pop(path)
+        self.cells -= cells
+
+    def _evict(self, max_cells):
+        """淘汰最近最少使用的excel，最近一次读取的excel始终保留"""
+        while max_cells and self.cells > max_cells and len(self._entries) > 1:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.cells = 0
+
+    @property
+    def stats(self):
+        """
+        :return: 缓存统计信息
+        """
+        return {'workbooks': len(self._entries), 'cells': self.cells, 'hits': self.hits, 'misses': self.misses,
+                'reloads': self.reloads, 'evictions': self.evictions}
+
+
+workbook_cache = WorkbookCache()
+
+
+def sheet_table(file_name, sheet_name):
+    """
+    :param file_name: excel文件名称
+    :param sheet_name: sheet名称
+    :return: 对应sheet的SheetTable，excel只在第一次访问或者被修改之后读取
+    """
+    return workbook_cache.sheet(file_name, sheet_name)
 
 
 class OperationExcel:
@@ -31,11 +180,21 @@ class OperationExcel:
         """
         self.file_name = file_name
         self.sheet_name = sheet_name
+        self._table = None
+
+    @property
+    def table(self):
+        """
+        :return: sheet的列存储SheetTable
+        """
+        if self._table is None:
+            self._table = sheet_table(self.file_name, self.sheet_name)
+        return self._table
 
     @property
     def get_sheet(self):
         """
-        :return: 获取到excel中sheet内容
+        :return: 获取到excel中sheet内容(xlrd的sheet对象，每次调用都会重新打开excel，仅用于单元格级别的访问)
         """
         import xlrd  # 延迟导入，防止循环导入
         data = xlrd.open_workbook(self.file_name)
@@ -47,86 +206,63 @@ class OperationExcel:
         """
         :return: 获取sheet表数
         """
-        rows = self.get_sheet.nrows
-        return rows
+        return self.table.nrows
 
     @property
     def get_col(self):
         """
         :return: 获取sheet表列数
         """
-        cols = self.get_sheet.ncols
-        return cols
+        return self.table.ncols
 
     @property
     def get_seq(self):
         """
         :return: 获取sheet表中每行的测试用例编号
         """
-        seqs = []
-        for i in range(1, self.get_rows):
-            seqs.append(self.get_sheet.cell_value(i, 0))
-        return seqs
+        return self.table.columns[0]
 
     @property
     def get_name(self):
         """
         :return: 获取sheet表中每行的测试用例名称
         """
-        tn = []
-        for i in range(1, self.get_rows):
-            tn.append(self.get_sheet.cell_value(i, 1))
-        return tn
+        return self.table.columns[1]
 
     @property
     def get_precondition(self):
         """
         :return: 获取sheet表中每行测试的预制条件
         """
-        pre_condition = []
-        for i in range(1, self.get_rows):
-            pre_condition.append(self.get_sheet.cell_value(i, 2))
-        return pre_condition
+        return self.table.columns[2]
 
     @property
     def get_url(self):
         """
         :return: 获取sheet表中每行测试的url
         """
-        url = []
-        for i in range(1, self.get_rows):
-            url.append(self.get_sheet.cell_value(i, 3))
-        return url
+        return self.table.columns[3]
 
     @property
     def get_date(self):
         """
         :return: 获取sheet表中每行测试的输入数据
         """
-        data = []
-        for i in range(1, self.get_rows):
-            data.append(self.get_sheet.cell_value(i, 4))
-        return data
+        return self.table.columns[4]
 
     @property
     def get_method(self):
         """
         :return: 获取sheet表中每行的测试方法
         """
-        method = []
-        for i in range(1, self.get_rows):
-            method.append(self.get_sheet.cell_value(i, 5))
-        return method
+        return self.table.columns[5]
 
     @property
     def get_status_code(self):  # need fix
         """
         :return: 获取sheet表中每行的响应参数
         """
-        status_code = []
-        for i in range(1, self.get_rows):
-            status_code.append(self.get_sheet.cell_value(i, 6))
-        return status_code
+        return self.table.columns[6]
 
     get_statuscode = get_status_code
 
@@ -135,20 +271,14 @@ class OperationExcel:
         """
         :return: 获取sheet表中每行的响应检查点
         """
-        code = []
-        for i in range(1, self.get_rows):
-            code.append(self.get_sheet.cell_value(i, 7))
-        return code
+        return self.table.columns[7]
 
     @property
     def get_error_code(self):
         """
         :return: 获取sheet表中每行的错误检查点
         """
-        error_code = []
-        for i in range(1, self.get_rows):
-            error_code.append(self.get_sheet.cell_value(i, 8))
-        return error_code
+        return self.table.columns[8]
 
     sheets = get_sheet
     error_codes = get_error_code
@@ -18,7 +18,10 @@
 #
 # *********************************************************************
 
+import hashlib
+import os
 import re
+import time
 
 from library.conf import settings
 
@@ -49,6 +52,44 @@ def file_export(url):
     return None
 
 
+def save_stream(response, file_path, chunk_size=None, preview_bytes=None):
+    """
+    + 说明：
+        将stream=True的响应内容分块写入导出文件，边写边计算sha1和字节数，不会把整个文件读到内存中。
+        先写入.part临时文件，下载完成之后再重命名，避免中断的时候留下不完整的导出文件
+
+    :param response: stream=True的requests.Response对象
+    :param file_path: 导出文件路径
+    :param chunk_size: 每次读取的字节数，默认读取配置EXPORT_CHUNK_SIZE
+    :param preview_bytes: 保留的文件开头字节数，用于日志显示，默认读取配置EXPORT_PREVIEW_BYTES
+    :return: (字节数, sha1, 文件开头preview_bytes个字节, 耗时秒数)
+    """
+    chunk_size = int(chunk_size or settings.get('EXPORT_CHUNK_SIZE') or 1024 * 1024)
+    preview_bytes = int(preview_bytes if preview_bytes is not None else settings.get('EXPORT_PREVIEW_BYTES') or 0)
+    digest = hashlib.sha1()
+    size = 0
+    preview = bytearray()
+    part_path = f'{file_path}.part'
+    start_timestamp = time.time()
+    try:
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if len(preview) < preview_bytes:
+                    preview += chunk[:preview_bytes - len(preview)]
+    except BaseException:
+        # 下载中断的时候删除不完整的临时文件
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.replace(part_path, file_path)
+    return size, digest.hexdigest(), bytes(preview), time.time() - start_timestamp
+
+
 def file_import(url):
     """
     + 说明：
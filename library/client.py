@@ -22,6 +22,7 @@ module doc string
 模拟浏览器发送http请求，带session会话保持
 """
 import time
+from collections.abc import Mapping
 
 import requests
 import urllib3
@@ -31,11 +32,18 @@ from requests.exceptions import (
     RequestException
 )
 
-from library.log import log
+from library.log import log, log_enabled
+from library.pacing import pacer
+from library.private_status_codes import annotate
+from library.requestlog import request_sink
 from library.utils import build_url, lower_dict_keys, omit_long_data
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# 每个请求完成之后依次调用，参数为(name, method, url, response_time_ms, content_size, exception)，
+# name默认为url，用于load模式按照name统计接口性能
+request_listeners = []
+
 
 class ApiResponse(Response):
     def raise_for_status(self):
@@ -44,6 +52,124 @@ class ApiResponse(Response):
         Response.raise_for_status(self)
 
 
+def placeholder_record():
+    """ request and response record before any response is received.
+    """
+    return {
+        "request": {
+            "url": "N/A",
+            "method": "N/A",
+            "headers": {}
+        },
+        "response": {
+            "status_code": "N/A",
+            "headers": {},
+            "encoding": None,
+            "content_type": ""
+        }
+    }
+
+
+def _format_details(req_resp_dict, r_type):
+    lines = ["", "================== {} details ==================".format(r_type)]
+    lines.extend("{:<16} : {}".format(key, repr(value)) for key, value in req_resp_dict[r_type].items())
+    lines.append("")
+    return "\n".join(lines)
+
+
+def build_req_resp_record(resp_obj):
+    """ get request and response info from Response() object.
+    """
+    req_resp_dict = {
+        "request": {},
+        "response": {}
+    }
+
+    # record actual request info
+    req_resp_dict["request"]["url"] = resp_obj.request.url
+    req_resp_dict["request"]["headers"] = dict(resp_obj.request.headers)
+
+    request_body = resp_obj.request.body
+    if request_body:
+        request_content_type = lower_dict_keys(
+            req_resp_dict["request"]["headers"]
+        ).get("content-type")
+        if request_content_type and "multipart/form-data" in request_content_type:
+            # upload file type
+            req_resp_dict["request"]["body"] = "upload file stream (OMITTED)"
+        else:
+            req_resp_dict["request"]["body"] = request_body
+
+    # record response info
+    req_resp_dict["response"]["ok"] = resp_obj.ok
+    req_resp_dict["response"]["url"] = resp_obj.url
+    req_resp_dict["response"]["status_code"] = resp_obj.status_code
+    req_resp_dict["response"]["reason"] = resp_obj.reason
+    req_resp_dict["response"]["cookies"] = resp_obj.cookies or {}
+    req_resp_dict["response"]["encoding"] = resp_obj.encoding
+    resp_headers = dict(resp_obj.headers)
+    req_resp_dict["response"]["headers"] = resp_headers
+
+    lower_resp_headers = lower_dict_keys(resp_headers)
+    content_type = lower_resp_headers.get("content-type", "")
+    req_resp_dict["response"]["content_type"] = content_type
+
+    if resp_obj.raw is not None and resp_obj._content is False:
+        # stream response which is not read yet, reading it here would break iter_content
+        req_resp_dict["response"]["content"] = "stream content (OMITTED)"
+    elif "image" in content_type:
+        # response is image type, record bytes content only
+        req_resp_dict["response"]["content"] = resp_obj.content
+    else:
+        try:
+            # try to record json data
+            req_resp_dict["response"]["json"] = annotate(resp_obj.json())
+        except ValueError:
+            # only record at most 512 text charactors
+            resp_text = resp_obj.text
+            req_resp_dict["response"]["text"] = omit_long_data(resp_text)
+
+    return req_resp_dict
+
+
+class ReqRespRecord(Mapping):
+    """
+    Request and response record of one Response() object.
+
+    Only a reference of the response is kept, the record dict (headers, json, status code name...) is built
+    the first time it is accessed, e.g. by a report or when debug logging is enabled, so that high-volume
+    runs don't pay for records nobody reads.
+    """
+    __slots__ = ('_response', '_record')
+
+    def __init__(self, resp_obj):
+        self._response = resp_obj
+        self._record = None
+
+    @property
+    def record(self):
+        if self._record is None:
+            self._record = build_req_resp_record(self._response)
+        return self._record
+
+    def __getitem__(self, key):
+        return self.record[key]
+
+    def __iter__(self):
+        return iter(self.record)
+
+    def __len__(self):
+        return len(self.record)
+
+    def __repr__(self):
+        return repr(self.record)
+
+    def log_details(self):
+        """ log request and response details in debug mode
+        """
+        log(lambda: _format_details(self.record, "request") + _format_details(self.record, "response"))
+
+
 class HttpSession(requests.Session):
     """
     Class for performing HTTP requests and holding (session-) cookies between requests (in order
@@ -68,21 +194,7 @@ class HttpSession(requests.Session):
         """
         self.meta_data = {
             "name": "",
-            "data": [
-                {
-                    "request": {
-                        "url": "N/A",
-                        "method": "N/A",
-                        "headers": {}
-                    },
-                    "response": {
-                        "status_code": "N/A",
-                        "headers": {},
-                        "encoding": None,
-                        "content_type": ""
-                    }
-                }
-            ],
+            "data": [placeholder_record()],
             "stat": {
                 "content_size": "N/A",
                 "response_time_ms": "N/A",
@@ -92,73 +204,9 @@ class HttpSession(requests.Session):
 
     def get_req_resp_record(self, resp_obj):
         """ get request and response info from Response() object.
+        the record is built lazily, see :py:class:`ReqRespRecord`.
         """
-
-        def log_print(req_resp_dict, r_type):
-            msg = "\n================== {} details ==================\n".format(r_type)
-            for key, value in req_resp_dict[r_type].items():
-                msg += "{:<16} : {}\n".format(key, repr(value))
-            log(msg)
-
-        req_resp_dict = {
-            "request": {},
-            "response": {}
-        }
-
-        # record actual request info
-        req_resp_dict["request"]["url"] = resp_obj.request.url
-        req_resp_dict["request"]["headers"] = dict(resp_obj.request.headers)
-
-        request_body = resp_obj.request.body
-        if request_body:
-            request_content_type = lower_dict_keys(
-                req_resp_dict["request"]["headers"]
-            ).get("content-type")
-            if request_content_type and "multipart/form-data" in request_content_type:
-                # upload file type
-                req_resp_dict["request"]["body"] = "upload file stream (OMITTED)"
-            else:
-                req_resp_dict["request"]["body"] = request_body
-
-        # log request details in debug mode
-        log_print(req_resp_dict, "request")
-
-        # record response info
-        req_resp_dict["response"]["ok"] = resp_obj.ok
-        req_resp_dict["response"]["url"] = resp_obj.url
-        req_resp_dict["response"]["status_code"] = resp_obj.status_code
-        req_resp_dict["response"]["reason"] = resp_obj.reason
-        req_resp_dict["response"]["cookies"] = resp_obj.cookies or {}
-        req_resp_dict["response"]["encoding"] = resp_obj.encoding
-        resp_headers = dict(resp_obj.headers)
-        req_resp_dict["response"]["headers"] = resp_headers
-
-        lower_resp_headers = lower_dict_keys(resp_headers)
-        content_type = lower_resp_headers.get("content-type", "")
-        req_resp_dict["response"]["content_type"] = content_type
-
-        if "image" in content_type:
-            # response is image type, record bytes content only
-            req_resp_dict["response"]["content"] = resp_obj.content
-        else:
-            try:
-                # try to record json data
-                resp_json = resp_obj.json()
-                from library.private_status_codes import codes as dcn_codes
-                dcn_raw_code = dcn_codes.get(resp_json['status'])
-                if dcn_raw_code:
-                    resp_json['status'] = (resp_json['status'], dcn_raw_code[0])
-                req_resp_dict["response"]["json"] = resp_json
-                # req_resp_dict["response"]["json"] = resp_obj.json()
-            except ValueError:
-                # only record at most 512 text charactors
-                resp_text = resp_obj.text
-                req_resp_dict["response"]["text"] = omit_long_data(resp_text)
-
-        # log response details in debug mode
-        log_print(req_resp_dict, "response")
-
-        return req_resp_dict
+        return ReqRespRecord(resp_obj)
 
     def request(self, method, url, name=None, **kwargs):
         """
@@ -203,6 +251,7 @@ class HttpSession(requests.Session):
         self.meta_data["name"] = name
 
         # record original request info
+        self.meta_data["data"] = [placeholder_record()]
         self.meta_data["data"][0]["request"]["method"] = method
         self.meta_data["data"][0]["request"]["url"] = url
         kwargs.setdefault("timeout", 120)
@@ -211,9 +260,11 @@ class HttpSession(requests.Session):
         # prepend url with hostname unless it's already an absolute URL
         url = build_url(self.base_url, url)
 
+        pacer.wait(url)
         start_timestamp = time.time()
         response = self._send_request_safe_mode(method, url, **kwargs)
         response_time_ms = round((time.time() - start_timestamp) * 1000, 2)
+        pacer.feedback(url, response_time_ms, response.status_code)
 
         # get the length of the content, but if the argument stream is set to True, we take
         # the size from the content-length header, in order to not trigger fetching of the body
@@ -235,19 +286,23 @@ class HttpSession(requests.Session):
             self.get_req_resp_record(resp_obj)
             for resp_obj in response_list
         ]
+        if log_enabled('debug'):
+            for record in self.meta_data["data"]:
+                record.log_details()
 
+        error = None
         try:
             response.raise_for_status()
         except RequestException as e:
+            error = e
             log(u"{exception}".format(exception=str(e)), level='error')
         else:
-            log(
-                """status_code: {}, response_time(ms): {} ms, response_length: {} bytes\n""".format(
-                    response.status_code,
-                    response_time_ms,
-                    content_size
-                ),
-            )
+            log("status_code: %s, response_time(ms): %s ms, response_length: %s bytes\n",
+                args=(response.status_code, response_time_ms, content_size))
+
+        request_sink.record(method, url, response, response_time_ms, content_size, error)
+        for listener in request_listeners:
+            listener(name or url, method, url, response_time_ms, content_size, error)
 
         return response
 
@@ -257,10 +312,7 @@ class HttpSession(requests.Session):
         Safe mode has been removed from requests 1.x.
         """
         try:
-            msg = "processed request:\n"
-            msg += "> {method} {url}\n".format(method=method, url=url)
-            msg += "> kwargs: {kwargs}".format(kwargs=kwargs)
-            log(msg)
+            log("processed request:\n> %s %s\n> kwargs: %s", args=(method, url, kwargs))
             return requests.Session.request(self, method, url, **kwargs)
         except (MissingSchema, InvalidSchema, InvalidURL):
             raise
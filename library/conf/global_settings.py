@@ -72,6 +72,52 @@ LOGLEVEL_COLOR_OPTS = {
 }
 
 
+# ----------------basesheetdata.py模块常量----------------------------------------------
+# excel缓存中允许保存的最大单元格数量，超过之后按照最近最少使用的顺序淘汰，0表示不限制
+WORKBOOK_CACHE_MAX_CELLS = 2000000
+
+# ----------------basicfunction.py模块常量----------------------------------------------
+# 导出文件分块下载的块大小，单位是字节
+EXPORT_CHUNK_SIZE = 1024 * 1024
+# 导出文件在日志中显示的开头字节数
+EXPORT_PREVIEW_BYTES = 2048
+
+# ----------------executor.py模块常量---------------------------------------------------
+# sheet中测试用例并发执行的线程数，1表示按照顺序执行
+API_CONCURRENCY = 1
+# 允许并发执行的请求方法（sheet中method列的前缀），其他方法的测试用例独占执行
+API_CONCURRENT_METHODS = ['get']
+
+# ----------------load.py模块常量-------------------------------------------------------
+# 压力测试虚拟用户数
+LOAD_USERS = 10
+# 压力测试目标每秒请求数，0表示不限制
+LOAD_RPS = 0
+# 压力测试持续时间，单位是秒
+LOAD_DURATION = 60
+# 压力测试结果文件
+LOAD_RESULT_FILE = 'load_result.json'
+
+# ----------------pacing.py模块常量-----------------------------------------------------
+# 每个目标host每秒请求数上限，0表示不限制
+PACING_RATE = 0
+# 令牌桶容量，允许短时间内突发的请求数，0表示与PACING_RATE相同
+PACING_BURST = 0
+# 根据5xx/429、连接失败以及响应时间自动调整请求速率(AIMD)
+PACING_ADAPTIVE = True
+# 自动调整的速率下限
+PACING_MIN_RATE = 1
+# 响应时间超过该值视为设备过载，单位是毫秒，0表示不检查响应时间
+PACING_LATENCY_TARGET_MS = 0
+
+# ----------------requestlog.py模块常量-------------------------------------------------
+# 每个请求写入一条结构化记录，可以通过python -m library.requestlog查询
+REQUEST_LOG_ON = True
+# 请求记录目录，相对路径表示在本次测试报告目录下
+REQUEST_LOG_DIR = 'requests'
+# 是否同时保存响应内容
+REQUEST_LOG_BODIES = True
+
 # --------------自定义unittest模块常量-----------------------------------------------------------------------
 
 
@@ -89,11 +135,23 @@ RUN_CASE = {Tag.SMOKE}
 # 开启用例排序
 SORT_CASE = True
 
-# 每个用例的执行间隔，单位是秒
-EXECUTE_INTERVAL = 0.1
 # 开启检测用例描述
 CHECK_CASE_DOC = True
 
+# 执行测试用例的worker进程数，1表示在当前进程中按照顺序执行
+WORKERS = 1
+# 测试用例执行时间历史文件，相对路径表示在测试报告根目录下，用于多进程执行时按照耗时分配测试类
+DURATION_HISTORY_FILE = 'duration_history.json'
+# 没有历史记录的时候，sheet中每行测试用例的预计耗时，单位是秒
+DURATION_ROW_SECONDS = 0.5
+# 没有历史记录也找不到sheet的测试用例的预计耗时，单位是秒
+DURATION_DEFAULT = 1.0
+# 测试结果库文件(sqlite)，相对路径表示在测试报告根目录下
+RESULT_STORE_FILE = 'results.sqlite3'
+# 重新执行模式：''全部执行，'failed-only'只执行上一次失败的，'failed-first'上一次失败的先执行，
+# 'changed-only'只执行sheet中最近一次通过之后修改过的行，通常由runtest.py的命令行参数指定
+RERUN_MODE = ''
+
 # 显示完整用例名字（函数名字+参数信息）
 FULL_CASE_NAME = False
 
@@ -105,6 +163,8 @@ SHOW_ERROR_TRACEBACK = True
 
 # 生成ztest风格的报告
 CREATE_ZTEST_STYLE_REPORT = True
+# ztest风格报告的测试数据单独写入<报告名>.data.js，由报告页面加载
+ZTEST_REPORT_DATA_FILE = False
 
 # 生成bstest风格的报告
 CREATE_BSTEST_STYLE_REPORT = False
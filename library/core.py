@@ -31,6 +31,7 @@ from pithy.utils import format_json
 from requests.sessions import Session
 
 from library.log import log
+from library.private_status_codes import annotate
 
 
 class PrivateHttpRequest(HttpRequest):
@@ -124,16 +125,11 @@ class PrivateJSONProcessor(JSONProcessor):
 def status_code_mapping(resp_json):
     """
     将接口返回的状态码转换成对应的名称，例如：0在接口文档描述中表述为此次操作成功 0 ->'操作成功'
+    只替换顶层的status，不复制整个响应
     :param resp_json: 要转换的json字符串
     :return: 转换后的json字符串
     """
-    from copy import deepcopy
-    change_resp_json = deepcopy(resp_json)
-    from library.private_status_codes import codes as dcn_codes
-    dcn_raw_code = dcn_codes.get(resp_json['status'])
-    if dcn_raw_code:
-        change_resp_json['status'] = f"{resp_json['status']}({dcn_raw_code[0]})"
-    return change_resp_json
+    return annotate(resp_json, text=True)
 
 
 class PrivateRequest(Request):
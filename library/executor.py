@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# executor.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/19 15:40  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    sheet测试用例并发执行引擎，在有限的线程池中并发执行互相独立的测试用例，同时保证以下测试用例按照顺序执行：
+
+        1. 用户登录/登出，以及导入文件的测试用例，执行之前等待前面所有测试用例完成，执行完成之后才继续后面的测试用例
+        2. method不在API_CONCURRENT_METHODS中的测试用例（默认只有查询类的get请求可以并发），处理方式同1
+        3. 预制条件列中写明了前面某个测试用例编号(seq)的测试用例，等待对应的测试用例完成之后才执行
+
+    不管执行顺序如何，返回结果始终按照sheet中seq的顺序排列。
+"""
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from library.basicfunction import assert_login, assert_login_out
+from library.conf import settings
+
+SEQ_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+def is_serial(plan):
+    """
+    + 说明：
+        判断测试用例是否需要独占执行
+
+    :param plan: library.plan.RowPlan
+    :return: True or False
+    """
+    if plan.handler is None or plan.import_file or assert_login(plan.url) or assert_login_out(plan.url):
+        return True
+    concurrent_methods = settings.get('API_CONCURRENT_METHODS') or ()
+    return not any(plan.method.startswith(method) for method in concurrent_methods)
+
+
+def preconditions(plan, seqs):
+    """
+    + 说明：
+        从预制条件列中解析出依赖的测试用例编号，只保留前面已经出现过的编号
+
+    :param plan: library.plan.RowPlan
+    :param seqs: 前面已经出现过的测试用例编号
+    :return: 依赖的测试用例编号列表
+    """
+    if plan.precondition in ('', None):
+        return []
+    return [seq for seq in {float(s) for s in SEQ_PATTERN.findall(str(plan.precondition))} if seq in seqs]
+
+
+def _run_after(dependencies, run_row, plan):
+    wait(dependencies)
+    return run_row(plan)
+
+
+class SheetExecutor(object):
+    """
+    + 说明：
+        sheet测试用例执行器，workers<=1的时候按照顺序执行
+    """
+
+    def __init__(self, workers=None):
+        """
+        :param workers: 并发线程数，默认读取配置API_CONCURRENCY
+        """
+        self.workers = int(workers if workers is not None else settings.get('API_CONCURRENCY') or 1)
+
+    def run(self, plans, run_row):
+        """
+        + 说明：
+            执行sheet中的测试用例
+
+        :param plans: RowPlan列表
+        :param run_row: 执行单个测试用例的函数，参数为RowPlan
+        :return: 每个测试用例run_row的返回值，顺序与plans一致
+        """
+        if self.workers <= 1 or len(plans) <= 1:
+            return [run_row(plan) for plan in plans]
+
+        futures = []
+        by_seq = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sheet') as pool:
+            # 线程池中的线程不继承调用方的contextvars（例如requestlog中的测试用例id），每个任务复制一份执行
+            def submit(fn, *args):
+                return pool.submit(contextvars.copy_context().run, fn, *args)
+
+            for plan in plans:
+                if is_serial(plan):
+                    wait(futures)
+                    future = submit(run_row, plan)
+                    wait([future])
+                else:
+                    dependencies = [by_seq[seq] for seq in preconditions(plan, by_seq)]
+                    if dependencies:
+                        future = submit(_run_after, dependencies, run_row, plan)
+                    else:
+                        future = submit(run_row, plan)
+                futures.append(future)
+                by_seq[float(plan.seq)] = future
+        return [future.result() for future in futures]
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# fixture.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/25 10:05  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    测试数据准备：先收集测试类需要的用户组/用户，provision的时候每条数据调用一次创建接口并记录创建出来的id，
+    清理的时候每种类型只调用一次批量删除接口，批量删除失败的时候自动退回逐个删除。
+
+    用法：
+        class TestXxx(unittest.TestCase):
+            provisioner = Provisioner(session)
+
+            @classmethod
+            def setUpClass(cls):
+                cls.user_one = cls.provisioner.require('user', user_one)
+                cls.provisioner.provision()  # 之后可以使用cls.user_one.id
+
+            @classmethod
+            def tearDownClass(cls):
+                cls.provisioner.teardown()
+
+    scope='session'的Provisioner可以在多个测试类之间共用（session_provisioner），相同key的数据只创建一次，进程退出的时候统一清理。
+
+    FixtureRegistry用于共用setUpClass中的登录、系统状态查询等准备工作：fixture第一次使用的时候才执行，
+    按照session/module/class范围缓存结果，fixture之间可以声明依赖，修改密码、设备恢复出厂等事件发生之后
+    通过notify使相关的fixture以及依赖它们的fixture失效，下一次使用的时候重新执行。
+
+        @fixture_registry.fixture(invalidated_by=(EVENT_PASSWORD_CHANGED, EVENT_DEVICE_RESET))
+        def super_admin_login():
+            return User().login_super_admin()
+
+        ret = fixture_registry.get('super_admin_login')
+"""
+import atexit
+import re
+import threading
+from collections import OrderedDict
+
+from library.conf import settings
+from library.decorator import SingletonMeta
+from library.exceptions import ParamsError, SetupHooksFailure, TeardownHooksFailure
+from library.log import log
+from library.private_status_codes import SUCCESSFUL_OPERATION
+
+# 数据类型: (创建, 删除单个, 批量删除)，值为route.yaml中的接口名称，route.yaml中没有配置创建接口的时候require报错；
+# 组织机构/AP等类型在route.yaml中配置好对应的接口之后再添加
+ENTITIES = OrderedDict([
+    ('group', ('create_single_organization_group', 'delete_single_group', 'batch_delete_user_group')),
+    ('user', ('create_user', 'delete_single_user', 'batch_delete_user')),
+])  # 按照依赖关系排序，创建的时候顺序执行，删除的时候逆序执行
+
+_routes = None
+
+
+def load_routes():
+    """
+    :return: route.yaml中接口名称到url的映射
+    """
+    global _routes
+    if _routes is None:
+        from library.loader import load_yaml_file
+        _routes = load_yaml_file(settings.as_path('DCN_CONFIG_PATH') / 'route.yaml')
+    return _routes
+
+
+def extract_id(resp_json):
+    """
+    :param resp_json: 创建接口返回的json
+    :return: 新建数据的id，没有找到返回None
+    """
+    for key in ('id', 'data', 'result'):
+        value = resp_json.get(key)
+        if isinstance(value, dict):
+            value = value.get('id')
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+class Entity(object):
+    """
+    + 说明：
+        一条测试数据，provision之后id为服务器返回的id
+    """
+    __slots__ = ('kind', 'data', 'key', 'id')
+
+    def __init__(self, kind, data, key):
+        self.kind = kind
+        self.data = data
+        self.key = key
+        self.id = None
+
+    def __repr__(self):
+        return f'<{self.kind} {self.key} id={self.id}>'
+
+
+class Provisioner(object):
+    """
+    + 说明：
+        测试数据创建与批量清理
+
+        requests：本Provisioner发出的请求数量，用于对比批量删除节省的请求
+    """
+
+    def __init__(self, session, scope='class', routes=None):
+        """
+        :param session: 已经登录的HttpSession（base_url为接口前缀）
+        :param scope: class或者session，session范围内相同key的数据只创建一次
+        :param routes: 接口名称到url的映射，默认读取config/route.yaml
+        """
+        self.session = session
+        self.scope = scope
+        self._routes = routes
+        self._pending = []
+        self._entities = OrderedDict()  # {key: Entity}
+        self._lock = threading.RLock()
+        self.requests = 0
+        self._teardown_registered = False
+
+    @property
+    def routes(self):
+        if self._routes is None:
+            self._routes = load_routes()
+        return self._routes
+
+    def _route(self, name, entity_id=None):
+        url = self.routes.get(name) if name else None
+        if url and entity_id is not None:
+            url = re.sub(r':\w+', str(entity_id), url)  # user/:user -> user/12
+        return url
+
+    def _call(self, method, url, **kwargs):
+        self.requests += 1
+        try:
+            resp_json = self.session.request(method, url, **kwargs).json()
+        except ValueError:
+            return {}
+        return resp_json if isinstance(resp_json, dict) else {}
+
+    def require(self, kind, data, key=None):
+        """
+        + 说明：
+            登记一条需要创建的测试数据，provision的时候统一创建
+
+        :param kind: 数据类型，ENTITIES中的group/user
+        :param data: 创建接口的json数据
+        :param key: 数据的唯一标识，默认为account或者name
+        :return: Entity
+        """
+        if kind not in ENTITIES:
+            raise SetupHooksFailure(f'不支持的测试数据类型 {kind}')
+        if not self._route(ENTITIES[kind][0]):
+            raise SetupHooksFailure(f'route.yaml中没有配置{kind}的创建接口 {ENTITIES[kind][0]}')
+        key = (kind, key or data.get('account') or data.get('name'))
+        with self._lock:
+            entity = self._entities.get(key)
+            if entity is None:
+                entity = self._entities[key] = Entity(kind, data, key[1])
+                self._pending.append(entity)
+            return entity
+
+    def provision(self):
+        """
+        + 说明：
+            按照ENTITIES的顺序逐条创建所有登记过并且还没有创建的测试数据
+
+        :return: 本次创建的Entity列表
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            try:
+                for kind in ENTITIES:
+                    entities = [entity for entity in pending if entity.kind == kind]
+                    if entities:
+                        self._create(kind, entities)
+            except SetupHooksFailure:
+                # 没有创建成功的数据不再保留，已经创建的数据在teardown中删除
+                for entity in pending:
+                    if entity.id is None:
+                        self._entities.pop((entity.kind, entity.key), None)
+                raise
+            if self.scope == 'session' and pending:
+                _register_session_teardown(self)
+            return pending
+
+    def _create(self, kind, entities):
+        url = self._route(ENTITIES[kind][0])
+        for entity in entities:
+            resp_json = self._call('POST', url, json=entity.data)
+            entity.id = extract_id(resp_json) if resp_json.get('status') == SUCCESSFUL_OPERATION else None
+            if entity.id is None:
+                raise SetupHooksFailure(f'创建{kind} {entity.key}失败: {resp_json}')
+        log(f'创建{kind}: {entities}', level='info')
+
+    def teardown(self):
+        """
+        + 说明：
+            按照创建的逆序删除所有已经创建的测试数据，每种类型优先使用一次批量删除
+        """
+        with self._lock:
+            failures = []
+            for kind in reversed(ENTITIES):
+                entities = [entity for entity in self._entities.values()
+                            if entity.kind == kind and entity.id is not None]
+                if entities:
+                    failures.extend(self._delete(kind, entities))
+            self._entities = OrderedDict((key, entity) for key, entity in self._entities.items()
+                                         if entity.id is not None)
+            self._pending = []
+            if failures:
+                raise TeardownHooksFailure(f'删除测试数据失败: {failures}')
+
+    def _delete(self, kind, entities):
+        _, delete, batch_delete = ENTITIES[kind]
+        batch_url = self._route(batch_delete)
+        if batch_url:
+            resp_json = self._call('POST', batch_url, json={'ids': [entity.id for entity in entities]})
+            if resp_json.get('status') == SUCCESSFUL_OPERATION:
+                log(f'批量删除{kind}: {entities}', level='info')
+                for entity in entities:
+                    entity.id = None
+                return []
+            log(f'批量删除{kind}失败，逐个删除: {resp_json}', level='warning')
+        failures = []
+        for entity in entities:
+            resp_json = self._call('DELETE', self._route(delete, entity.id))
+            if resp_json.get('status') == SUCCESSFUL_OPERATION:
+                entity.id = None
+            else:
+                failures.append(entity)
+        return failures
+
+    def __enter__(self):
+        self.provision()
+        return self
+
+    def __exit__(self, *args):
+        self.teardown()
+
+
+_session_provisioners = {}
+_session_lock = threading.Lock()
+
+
+def _register_session_teardown(provisioner):
+    if provisioner._teardown_registered:
+        return
+    provisioner._teardown_registered = True
+
+    def _teardown():
+        try:
+            provisioner.teardown()
+        except TeardownHooksFailure as e:
+            log(str(e), level='error')
+
+    atexit.register(_teardown)
+
+
+def session_provisioner(session, routes=None):
+    """
+    + 说明：
+        测试进程内共用的Provisioner，同一个session只创建一个，进程退出的时候统一清理
+
+    :param session: 已经登录的HttpSession
+    :param routes: 接口名称到url的映射，默认读取config/route.yaml
+    :return: scope为session的Provisioner
+    """
+    with _session_lock:
+        provisioner = _session_provisioners.get(id(session))
+        if provisioner is None:
+            provisioner = _session_provisioners[id(session)] = Provisioner(session, scope='session', routes=routes)
+        return provisioner
+
+
+SCOPE_SESSION = 'session'
+SCOPE_MODULE = 'module'
+SCOPE_CLASS = 'class'
+
+EVENT_LOGOUT = 'logout'  # 登出或者切换了登录用户
+EVENT_PASSWORD_CHANGED = 'password_changed'
+EVENT_DEVICE_RESET = 'device_reset'  # 设备恢复出厂设置(init_device)或者重新初始化
+
+
+class FixtureDef(object):
+    """fixture定义"""
+    __slots__ = ('name', 'func', 'scope', 'depends', 'invalidated_by', 'cache_if')
+
+    def __init__(self, name, func, scope, depends, invalidated_by, cache_if):
+        self.name = name
+        self.func = func
+        self.scope = scope
+        self.depends = tuple(depends)
+        self.invalidated_by = frozenset(invalidated_by)
+        self.cache_if = cache_if
+
+
+class FixtureRegistry(metaclass=SingletonMeta):
+    """
+    + 说明：
+        fixture注册表，惰性执行并按照范围缓存fixture的结果
+
+        hits：直接使用缓存结果的次数
+        misses：执行fixture的次数
+    """
+
+    def __init__(self):
+        self._definitions = {}
+        self._values = {}  # {(fixture名称, 范围key): 结果}
+        self._rlock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name, func, scope=SCOPE_SESSION, depends=(), invalidated_by=(), cache_if=None):
+        """
+        :param name: fixture名称
+        :param func: fixture函数，参数依次为depends中fixture的结果
+        :param scope: session/module/class，决定结果在哪个范围内共用
+        :param depends: 依赖的fixture名称
+        :param invalidated_by: 使fixture失效的事件名称
+        :param cache_if: 判断结果是否可以缓存的函数，例如登录失败的结果不缓存
+        """
+        if scope not in (SCOPE_SESSION, SCOPE_MODULE, SCOPE_CLASS):
+            raise ParamsError(f'不支持的fixture范围 {scope}')
+        with self._rlock:
+            self._definitions[name] = FixtureDef(name, func, scope, depends, invalidated_by, cache_if)
+            self._drop({name})
+
+    def fixture(self, name=None, scope=SCOPE_SESSION, depends=(), invalidated_by=(), cache_if=None):
+        """register的装饰器形式，fixture名称默认为函数名"""
+
+        def decorate(func):
+            self.register(name or func.__name__, func, scope, depends, invalidated_by, cache_if)
+            return func
+
+        return decorate
+
+    @staticmethod
+    def _scope_key(definition, owner):
+        if definition.scope == SCOPE_SESSION or owner is None:
+            return None
+        module = owner if isinstance(owner, str) else owner.__module__
+        if definition.scope == SCOPE_MODULE:
+            return module
+        return f'{module}.{getattr(owner, "__qualname__", owner)}'
+
+    def get(self, name, owner=None):
+        """
+        + 说明：
+            获取fixture的结果，没有缓存的时候先获取依赖的fixture再执行
+
+        :param name: fixture名称
+        :param owner: 使用fixture的测试类（或者模块名称），module/class范围的fixture按照owner缓存
+        :return: fixture的结果
+        """
+        return self._get(name, owner, ())
+
+    def _get(self, name, owner, resolving):
+        if name in resolving:
+            raise ParamsError(f'fixture循环依赖: {" -> ".join(resolving + (name,))}')
+        with self._rlock:
+            definition = self._definitions.get(name)
+            if definition is None:
+                raise ParamsError(f'fixture {name} 没有注册')
+            key = (name, self._scope_key(definition, owner))
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            args = [self._get(depend, owner, resolving + (name,)) for depend in definition.depends]
+            self.misses += 1
+            value = definition.func(*args)
+            if definition.cache_if is None or definition.cache_if(value):
+                self._values[key] = value
+            return value
+
+    def _dependents(self, names):
+        """names以及所有直接或者间接依赖names的fixture"""
+        result = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for definition in self._definitions.values():
+                if definition.name not in result and result.intersection(definition.depends):
+                    result.add(definition.name)
+                    changed = True
+        return result
+
+    def _drop(self, names):
+        for key in [key for key in self._values if key[0] in names]:
+            del self._values[key]
+
+    def invalidate(self, *names):
+        """
+        :param names: 需要失效的fixture名称，依赖它们的fixture同时失效，不传表示全部失效
+        """
+        with self._rlock:
+            if not names:
+                self._values.clear()
+                return
+            self._drop(self._dependents(names))
+
+    def notify(self, event):
+        """
+        + 说明：
+            通知事件发生，invalidated_by中包含该事件的fixture以及依赖它们的fixture失效
+
+        :param event: 事件名称，例如EVENT_PASSWORD_CHANGED
+        """
+        with self._rlock:
+            names = {name for name, definition in self._definitions.items() if event in definition.invalidated_by}
+            if names:
+                log(f'{event}: fixture {sorted(self._dependents(names))}失效')
+                self._drop(self._dependents(names))
+
+    @property
+    def stats(self):
+        """
+        :return: fixture统计信息
+        """
+        return {'fixtures': len(self._definitions), 'cached': len(self._values), 'hits': self.hits,
+                'misses': self.misses}
+
+
+fixture_registry = FixtureRegistry()
@@ -17,8 +17,27 @@
 #       - 2018/8/13 10:32  add by wangxinae
 #
 # *********************************************************************
+import atexit
+import json
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+
 # from interfacetest.projectsettings import project_settings
+from library import private_status_codes as dcn_codes
+from library.basicfunction import assert_login_out
 from library.conf import settings as project_settings
+from library.decorator import SingletonMeta
+from library.exceptions import ParamsError
+from library.pacing import pacer
+from library.requestlog import request_sink
+
+ROLE_ADMIN = 'admin'
+ROLE_USER = 'user'
+ROLE_GENERAL_ADMIN = 'general_admin'
+ROLE_NO_LOGIN = 'no_login'
 
 
 class HttpLogin(object):
@@ -62,14 +81,200 @@ class HttpLogin(object):
         return session
 
 
+class PooledSession(requests.Session):
+    """
+    + 说明：
+        会话池中的会话，首次请求之前登录一次，之后复用keep-alive连接和cookies。
+        服务器返回状态码6（SESSION中当前登录用户为空）时重新登录并重发一次请求。
+        不需要登录的会话(login为None)拒绝保存任何cookies，避免被登录接口的响应污染。
+    """
+
+    def __init__(self, pool, role, login=None):
+        super(PooledSession, self).__init__()
+        self.pool = pool
+        self.role = role
+        self.login = login
+        self.generation = 0  # 每登录一次加1，用于多线程下避免重复登录，登出之后置0
+        self.logins = 0
+        self._login_lock = threading.Lock()
+        if login is None:
+            self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def authenticate(self, generation=None):
+        """
+        登录并刷新会话cookies，如果其他线程已经完成重新登录(generation发生变化)则直接返回
+
+        :param generation: 发起登录时观察到的登录代数
+        """
+        with self._login_lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self.logins:
+                self.pool.relogins += 1
+            data = {'account': self.login.username, 'password': self.login.password}
+            requests.Session.request(self, 'POST', self.login.url, data=json.dumps(data), headers=self.login.headers)
+            self.generation += 1
+            self.logins += 1
+
+    def _send(self, method, url, *args, **kwargs):
+        """
+        按照pacing控制请求速率发送请求，并把响应时间和状态码反馈给pacer
+
+        :return: (响应, 响应时间(ms))
+        """
+        pacer.wait(url)
+        start_timestamp = time.time()
+        try:
+            response = super(PooledSession, self).request(method, url, *args, **kwargs)
+        except requests.RequestException as e:
+            response_time_ms = round((time.time() - start_timestamp) * 1000, 2)
+            pacer.feedback(url, response_time_ms, 0)
+            failed = requests.Response()
+            failed.status_code = 0
+            failed.request = requests.Request(method, url).prepare()
+            request_sink.record(method, url, failed, response_time_ms, 0, e)
+            raise
+        response_time_ms = round((time.time() - start_timestamp) * 1000, 2)
+        pacer.feedback(url, response_time_ms, response.status_code)
+        return response, response_time_ms
+
+    def request(self, method, url, *args, **kwargs):
+        if self.login is None:
+            response, response_time_ms = self._send(method, url, *args, **kwargs)
+        else:
+            generation = self.generation
+            if not generation:
+                self.authenticate(generation)
+                generation = self.generation
+            response, response_time_ms = self._send(method, url, *args, **kwargs)
+            # stream=True（导出文件）的时候只检查带Content-Length的短响应，避免把大文件读到内存中
+            if (not kwargs.get('stream') or int(response.headers.get('Content-Length') or 1025) <= 1024) \
+                    and session_expired(response):
+                self.authenticate(generation)
+                _rewind_files(kwargs.get('files'), kwargs.get('data'))
+                response, response_time_ms = self._send(method, url, *args, **kwargs)
+            if assert_login_out(url):
+                self.generation = 0  # 登出之后下一次请求之前重新登录
+
+        # 重新登录之后只记录最终的请求；stream模式的响应从content-length获取大小，不读取响应内容
+        if isinstance(getattr(response, '_content', None), bytes):
+            content_size = len(response._content)
+        else:
+            content_size = int(response.headers.get('Content-Length') or 0)
+        request_sink.record(method, url, response, response_time_ms, content_size)
+        return response
+
+
+def session_expired(response):
+    """
+    + 说明：
+        判断响应是否为状态码6（SESSION中当前登录用户为空），只解析较短的json响应，避免对大数据列表重复解析
+
+    :param response: requests.Response对象
+    :return: True or False
+    """
+    if 'json' not in response.headers.get('Content-Type', '') or len(response.content) > 1024:
+        return False
+    try:
+        return response.json().get('status') == dcn_codes.SESSION_USER_NOT_FOUND
+    except (ValueError, AttributeError):
+        return False
+
+
+def _rewind_files(files, data=None):
+    """重发请求之前将上传文件以及流式请求体（例如multipart.MultipartEncoder）的指针恢复到起始位置"""
+    for value in (files or {}).values():
+        file = value[1] if isinstance(value, (tuple, list)) else value
+        if hasattr(file, 'seek'):
+            file.seek(0)
+    if hasattr(data, 'seek'):
+        data.seek(0)
+
+
+class SessionPool(metaclass=SingletonMeta):
+    """
+    + 说明：
+        按照角色（超级管理员/普通用户/普通管理员/未登录）缓存会话，每个角色只登录一次，
+        所有sheet和测试步骤共用同一个会话的keep-alive连接。
+
+        hits：从池中直接取到会话的次数
+        misses：池中不存在需要新建会话的次数
+        relogins：会话过期之后重新登录的次数
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.relogins = 0
+
+    @staticmethod
+    def credentials(role):
+        """
+        :param role: 会话角色
+        :return: 角色对应的HttpLogin实例，未登录角色返回None
+        """
+        if role == ROLE_NO_LOGIN:
+            return None
+        if role == ROLE_ADMIN:
+            return HttpLogin()
+        if role == ROLE_USER:
+            return HttpLogin(username=project_settings.username1, password=project_settings.password1)
+        if role == ROLE_GENERAL_ADMIN:
+            return HttpLogin(username=project_settings.username4, password=project_settings.password4)
+        raise ParamsError(f'未知的会话角色 {role}')
+
+    def session(self, role=None):
+        """
+        :param role: 会话角色，默认为超级管理员
+        :return: 角色对应的PooledSession
+        """
+        role = role or ROLE_ADMIN
+        with self._lock:
+            session = self._sessions.get(role)
+            if session is None:
+                self.misses += 1
+                session = PooledSession(self, role, self.credentials(role))
+                self._sessions[role] = session
+            else:
+                self.hits += 1
+            return session
+
+    def invalidate(self, role=None):
+        """
+        关闭并移除指定角色的会话，role为None时清空整个会话池
+
+        :param role: 会话角色
+        """
+        with self._lock:
+            roles = [role] if role else list(self._sessions)
+            for _role in roles:
+                session = self._sessions.pop(_role, None)
+                if session is not None:
+                    session.close()
+
+    close = invalidate
+
+    @property
+    def stats(self):
+        """
+        :return: 会话池统计信息
+        """
+        return {'sessions': len(self._sessions), 'hits': self.hits, 'misses': self.misses,
+                'relogins': self.relogins}
+
+
+session_pool = SessionPool()
+atexit.register(session_pool.close)
+
+
 def http_session_admin():
     """
 
     :return: 用于管理员用户的会话保持
     """
-    s = HttpLogin()
-    http_session = s.http_login()
-    return http_session
+    return session_pool.session(ROLE_ADMIN)
 
 
 def http_session_user():
@@ -77,9 +282,7 @@ def http_session_user():
 
     :return: 用于普通用户的会话保持
     """
-    s = HttpLogin(username=project_settings.username1, password=project_settings.password1)
-    http_session = s.http_login()
-    return http_session
+    return session_pool.session(ROLE_USER)
 
 
 def http_session_general_admin():
@@ -87,6 +290,12 @@ def http_session_general_admin():
 
     :return: 用于普通管理员的会话保持
     """
-    s = HttpLogin(username=project_settings.username4, password=project_settings.password4)
-    http_session = s.http_login()
-    return http_session
+    return session_pool.session(ROLE_GENERAL_ADMIN)
+
+
+def http_session_no_login():
+    """
+
+    :return: 用于未登录用户的会话，复用连接但不保存cookies
+    """
+    return session_pool.session(ROLE_NO_LOGIN)
@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# load.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/21 10:30  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    压力测试模式，不依赖外部压测服务：N个虚拟用户在指定时间内以目标RPS重复执行sheet或者testcases中的测试类，
+    按照请求的name统计响应时间分布(p50/p90/p99/max)、吞吐量以及错误率，结果保存为json文件。
+
+    1. sheet：每个虚拟用户使用自己的会话（按照method列中的角色登录一次），依次重放sheet中的请求，
+       name为测试点名称；登录/登出以及导入文件的测试用例不参与重放
+    2. testcases测试类：每个虚拟用户重复执行整个测试类，测试类中HttpSession发出的请求按照request的name统计，
+       每个测试方法的执行时间按照[test] 测试方法id统计；RPS限制的是测试类的执行次数
+
+    命令行用法：
+        python -m library.load --sheet testdata/user.xls:用户管理 --users 20 --rps 100 --duration 60
+        python -m library.load --testcase testcases.user.test_get_out_public_group_user.TestGetOutPublicGroupUser
+        python -m library.load --sheet testdata/user.xls:用户管理 --local  # 使用本地模拟服务器代替设备
+"""
+import argparse
+import importlib
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.exceptions import RequestException
+
+from library.basicfunction import assert_login, assert_login_out
+from library.client import request_listeners
+from library.conf import settings
+from library.exceptions import ParamsError
+from library.httpsession import (
+    PooledSession, ROLE_ADMIN, ROLE_GENERAL_ADMIN, ROLE_NO_LOGIN, ROLE_USER, session_pool
+)
+from library.log import log
+from library.pacing import HostBucket, pacer
+from library.plan import compile_sheet
+
+# sheet表中method列的前缀对应的http请求方法以及请求参数的传递方式，顺序同SessionMethod
+VERBS = (('post', 'POST', 'json'), ('get', 'GET', 'params'), ('put', 'PUT', 'json'), ('delete', 'DELETE', None),
+         ('head', 'HEAD', None), ('patch', 'PATCH', 'json'), ('option', 'OPTIONS', None))
+# sheet表中method列的后缀对应的会话角色
+ROLES = {'': ROLE_ADMIN, 'user': ROLE_USER, 'admin': ROLE_GENERAL_ADMIN, 'nologin': ROLE_NO_LOGIN}
+PERCENTILES = (50, 90, 99)
+MAX_ERROR_KINDS = 10
+
+
+class LatencyHistogram(object):
+    """
+    + 说明：
+        响应时间直方图，按照两位有效数字分桶（相对误差不超过5%），内存占用与请求次数无关
+    """
+    __slots__ = ('buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def record(self, response_time_ms):
+        """
+        :param response_time_ms: 响应时间，单位是毫秒
+        """
+        bucket = float('%.2g' % response_time_ms)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += response_time_ms
+        self.max = max(self.max, response_time_ms)
+        self.min = response_time_ms if self.min is None else min(self.min, response_time_ms)
+
+    def percentile(self, percent):
+        """
+        :param percent: 百分位，例如99
+        :return: 对应百分位的响应时间，单位是毫秒
+        """
+        if not self.count:
+            return 0
+        target = self.count * percent / 100.0
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min(bucket, self.max)
+        return self.max
+
+
+class RequestStats(object):
+    """同一个name的请求统计"""
+
+    def __init__(self, method):
+        self.method = method
+        self.histogram = LatencyHistogram()
+        self.failures = 0
+        self.content_size = 0
+        self.errors = {}
+
+    def record(self, response_time_ms, content_size, error=None):
+        self.histogram.record(response_time_ms)
+        self.content_size += content_size or 0
+        if error is not None:
+            self.failures += 1
+            message = str(error)
+            if message in self.errors or len(self.errors) < MAX_ERROR_KINDS:
+                self.errors[message] = self.errors.get(message, 0) + 1
+
+    def summary(self, elapsed):
+        """
+        :param elapsed: 压力测试持续时间，单位是秒
+        :return: 统计结果字典
+        """
+        histogram = self.histogram
+        count = histogram.count
+        summary = {
+            'method': self.method,
+            'requests': count,
+            'failures': self.failures,
+            'error_rate': round(self.failures / count, 4) if count else 0,
+            'rps': round(count / elapsed, 2) if elapsed else 0,
+            'avg_ms': round(histogram.total / count, 2) if count else 0,
+            'min_ms': round(histogram.min or 0, 2),
+        }
+        for percent in PERCENTILES:
+            summary[f'p{percent}_ms'] = round(histogram.percentile(percent), 2)
+        summary['max_ms'] = round(histogram.max, 2)
+        summary['avg_content_size'] = round(self.content_size / count, 2) if count else 0
+        if self.errors:
+            summary['errors'] = self.errors
+        return summary
+
+
+class LoadStats(object):
+    """
+    + 说明：
+        压力测试统计，按照请求name汇总，多个虚拟用户线程共用
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._total = RequestStats('ALL')
+        self._lock = threading.Lock()
+
+    def record(self, name, method, response_time_ms, content_size, error=None):
+        """
+        :param name: 请求名称
+        :param method: 请求方法
+        :param response_time_ms: 响应时间，单位是毫秒
+        :param content_size: 响应内容长度
+        :param error: 请求失败时候的异常
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._entries[name] = RequestStats(method)
+            entry.record(response_time_ms, content_size, error)
+            if method != 'TEST':
+                self._total.record(response_time_ms, content_size, error)
+
+    def listener(self, name, method, url, response_time_ms, content_size, error):
+        """client.request_listeners监听函数"""
+        self.record(name, method, response_time_ms, content_size, error)
+
+    def report(self, elapsed):
+        """
+        :param elapsed: 压力测试持续时间，单位是秒
+        :return: {'total': 所有请求统计, 'requests': {name: 统计}}
+        """
+        with self._lock:
+            return {
+                'total': self._total.summary(elapsed),
+                'requests': {name: entry.summary(elapsed) for name, entry in sorted(self._entries.items())},
+            }
+
+
+def replayable(plan):
+    """
+    :param plan: library.plan.RowPlan
+    :return: 测试用例是否可以在压力测试中重放
+    """
+    return (plan.handler is not None and not plan.import_file and not assert_login(plan.url)
+            and not assert_login_out(plan.url))
+
+
+def row_request(plan):
+    """
+    + 说明：
+        将sheet中的一行测试用例转换成http请求
+
+    :param plan: library.plan.RowPlan
+    :return: (http请求方法, 会话角色, 请求参数)
+    """
+    for prefix, method, argument in VERBS:
+        if plan.method.startswith(prefix):
+            role = ROLES.get(plan.method[len(prefix):], ROLE_ADMIN)
+            kwargs = {argument: plan.data} if argument and plan.data not in ('', None) else {}
+            return method, role, kwargs
+    raise ParamsError(f'不支持的method {plan.method}')
+
+
+class SheetScenario(object):
+    """重放sheet中的测试用例"""
+
+    def __init__(self, file_name, sheet_name):
+        """
+        :param file_name: excel文件路径或者settings中excel文件的名称
+        :param sheet_name: sheet名称
+        """
+        if not os.path.exists(str(file_name)) and settings.get(file_name):
+            file_name = settings.get(file_name)
+        self.name = f'{os.path.basename(str(file_name))}:{sheet_name}'
+        self.requests = [(f'{plan.seq:g} {plan.name}' if isinstance(plan.seq, float) else f'{plan.seq} {plan.name}',
+                          *row_request(plan), plan.url)
+                         for plan in compile_sheet(file_name, sheet_name) if replayable(plan)]
+        if not self.requests:
+            raise ParamsError(f'{self.name}中没有可以重放的测试用例')
+
+    def new_user(self):
+        """
+        :return: 虚拟用户的会话，每个角色一个，登录耗时不计入统计
+        """
+        sessions = {}
+        for _, _, role, _, _ in self.requests:
+            if role not in sessions:
+                session = sessions[role] = PooledSession(session_pool, role, session_pool.credentials(role))
+                if session.login is not None:
+                    session.authenticate()
+        return sessions
+
+    @staticmethod
+    def close_user(sessions):
+        for session in sessions.values():
+            session.close()
+
+    def run(self, sessions, gate, stats):
+        """
+        + 说明：
+            虚拟用户执行一遍sheet中的请求
+
+        :param sessions: new_user返回的会话
+        :param gate: 每个请求之前调用，返回False表示压力测试结束
+        :param stats: LoadStats
+        :return: 压力测试结束的时候返回False
+        """
+        for name, method, role, kwargs, url in self.requests:
+            if not gate():
+                return False
+            error = None
+            content_size = 0
+            start_timestamp = time.time()
+            try:
+                response = sessions[role].request(method, url, timeout=120, **kwargs)
+                content_size = len(response.content or b'')
+                response.raise_for_status()
+            except RequestException as e:
+                error = e
+            stats.record(name, method, round((time.time() - start_timestamp) * 1000, 2), content_size, error)
+        return True
+
+
+class _LoadTestResult(unittest.TestResult):
+    """记录每个测试方法的执行时间和结果"""
+
+    def __init__(self, stats):
+        super(_LoadTestResult, self).__init__()
+        self.stats = stats
+        self._current = None
+        self._error = None
+        self._start = 0
+
+    def startTest(self, test):
+        super(_LoadTestResult, self).startTest(test)
+        self._current, self._error, self._start = test, None, time.time()
+
+    def stopTest(self, test):
+        super(_LoadTestResult, self).stopTest(test)
+        self.stats.record(f'[test] {test.id()}', 'TEST', round((time.time() - self._start) * 1000, 2), 0, self._error)
+        self._current = None
+
+    def _add_error(self, test, err):
+        if test is self._current:
+            self._error = err[1]
+        else:  # setUpClass/tearDownClass中的异常
+            self.stats.record(f'[test] {test.id()}', 'TEST', 0, 0, err[1])
+
+    def addError(self, test, err):
+        super(_LoadTestResult, self).addError(test, err)
+        self._add_error(test, err)
+
+    def addFailure(self, test, err):
+        super(_LoadTestResult, self).addFailure(test, err)
+        self._add_error(test, err)
+
+
+class TestCaseScenario(object):
+    """重复执行testcases中的测试类"""
+
+    def __init__(self, test_case):
+        """
+        :param test_case: unittest.TestCase子类或者其完整路径，例如testcases.user.test_xxx.TestXxx
+        """
+        if isinstance(test_case, str):
+            module_name, _, class_name = test_case.rpartition('.')
+            test_case = getattr(importlib.import_module(module_name), class_name)
+        self.test_case = test_case
+        self.name = f'{test_case.__module__}.{test_case.__qualname__}'
+
+    @staticmethod
+    def new_user():
+        return None
+
+    @staticmethod
+    def close_user(user):
+        pass
+
+    def run(self, user, gate, stats):
+        """参数同SheetScenario.run，每次执行整个测试类之前调用一次gate"""
+        if not gate():
+            return False
+        unittest.defaultTestLoader.loadTestsFromTestCase(self.test_case).run(_LoadTestResult(stats))
+        return True
+
+
+class LoadRunner(object):
+    """
+    + 说明：
+        压力测试执行器，每个虚拟用户一个线程
+    """
+
+    def __init__(self, scenario, users=None, rps=None, duration=None):
+        """
+        :param scenario: SheetScenario或者TestCaseScenario
+        :param users: 虚拟用户数，默认读取配置LOAD_USERS
+        :param rps: 目标每秒请求数，默认读取配置LOAD_RPS
+        :param duration: 持续时间，单位是秒，默认读取配置LOAD_DURATION
+        """
+        self.scenario = scenario
+        self.users = int(users if users is not None else settings.get('LOAD_USERS') or 1)
+        self.rps = float(rps if rps is not None else settings.get('LOAD_RPS') or 0)
+        self.duration = float(duration if duration is not None else settings.get('LOAD_DURATION') or 60)
+
+    def _user(self, stats, bucket, deadline):
+        user = self.scenario.new_user()
+        try:
+            while time.time() < deadline and self.scenario.run(user, lambda: bucket.acquire(deadline), stats):
+                pass
+        except Exception as e:
+            log(f'虚拟用户{threading.current_thread().name}异常退出: {e!r}', level='error')
+        finally:
+            self.scenario.close_user(user)
+
+    def run(self, result_file=None):
+        """
+        + 说明：
+            执行压力测试并保存结果
+
+        :param result_file: 结果文件路径，默认读取配置LOAD_RESULT_FILE
+        :return: 统计结果字典
+        """
+        stats = LoadStats()
+        # 所有虚拟用户共用一个令牌桶控制整体每秒请求数
+        bucket = HostBucket(self.scenario.name, self.rps)
+        log(f'开始压力测试{self.scenario.name}: {self.users}个虚拟用户，目标RPS {self.rps or "不限制"}，'
+            f'持续{self.duration}秒', level='info')
+        request_listeners.append(stats.listener)
+        start_timestamp = time.time()
+        deadline = start_timestamp + self.duration
+        try:
+            # 压力测试的请求速率由LOAD_RPS控制，不受PACING_RATE限制
+            with pacer.suspended():
+                threads = [threading.Thread(target=self._user, args=(stats, bucket, deadline),
+                                            name=f'load-user-{i}', daemon=True) for i in range(self.users)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            request_listeners.remove(stats.listener)
+        elapsed = time.time() - start_timestamp
+
+        report = {
+            'scenario': self.scenario.name,
+            'users': self.users,
+            'target_rps': self.rps,
+            'duration': round(elapsed, 2),
+        }
+        report.update(stats.report(elapsed))
+        result_file = result_file or settings.get('LOAD_RESULT_FILE') or 'load_result.json'
+        with open(result_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        log(format_report(report) + f'\n压力测试结果已保存到{os.path.abspath(result_file)}', level='info')
+        return report
+
+
+def format_report(report):
+    """
+    :param report: LoadRunner.run返回的统计结果
+    :return: 用于日志输出的统计表格
+    """
+    header = f'{"name":<48} {"reqs":>8} {"fails":>6} {"rps":>8} {"p50":>8} {"p90":>8} {"p99":>8} {"max":>8}'
+    lines = ['', header, '-' * len(header)]
+    rows = list(report['requests'].items()) + [('Total', report['total'])]
+    for name, entry in rows:
+        lines.append(f'{name[:48]:<48} {entry["requests"]:>8} {entry["failures"]:>6} {entry["rps"]:>8} '
+                     f'{entry["p50_ms"]:>8} {entry["p90_ms"]:>8} {entry["p99_ms"]:>8} {entry["max_ms"]:>8}')
+    return '\n'.join(lines)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    + 说明：
+        本地模拟设备：所有接口返回{"status": 0, "data": []}，登录接口下发SID cookie
+    """
+    protocol_version = 'HTTP/1.1'
+    latency = 0  # 模拟的接口处理时间，单位是秒
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({'status': 0, 'data': []}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        if assert_login(self.path):
+            self.send_header('Set-Cookie', f'SID={threading.get_ident()}; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_PATCH = do_OPTIONS = _reply
+
+
+def stand_in_server(host='127.0.0.1', port=0, latency=0):
+    """
+    + 说明：
+        在后台线程中启动本地模拟设备
+
+    :param host: 监听地址
+    :param port: 监听端口，0表示随机端口
+    :param latency: 模拟的接口处理时间，单位是秒
+    :return: ThreadingHTTPServer，base_url属性为可以直接使用的base url
+    """
+    handler = type('StandInHandler', (StandInHandler,), {'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.base_url = f'http://{server.server_address[0]}:{server.server_address[1]}/'
+    threading.Thread(target=server.serve_forever, name='stand-in-server', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m library.load', description='接口压力测试')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--sheet', help='excel文件路径:sheet名称')
+    target.add_argument('--testcase', help='测试类完整路径，例如testcases.user.test_xxx.TestXxx')
+    parser.add_argument('--users', type=int, help='虚拟用户数')
+    parser.add_argument('--rps', type=float, help='目标每秒请求数，0表示不限制')
+    parser.add_argument('--duration', type=float, help='持续时间，单位是秒')
+    parser.add_argument('--output', help='结果文件路径')
+    parser.add_argument('--local', action='store_true', help='启动本地模拟设备代替真实设备')
+    parser.add_argument('--latency', type=float, default=0, help='本地模拟设备的接口处理时间，单位是毫秒')
+    args = parser.parse_args(argv)
+
+    from projectsettings import setup
+    setup()
+    if args.local:
+        server = stand_in_server(latency=args.latency / 1000.0)
+        settings.set('base_url', server.base_url)
+        log(f'本地模拟设备已启动: {server.base_url}', level='info')
+
+    if args.sheet:
+        file_name, _, sheet_name = args.sheet.rpartition(':')
+        scenario = SheetScenario(file_name, sheet_name)
+    else:
+        scenario = TestCaseScenario(args.testcase)
+    return LoadRunner(scenario, args.users, args.rps, args.duration).run(args.output)
+
+
+if __name__ == '__main__':
+    main()
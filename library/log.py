@@ -68,6 +68,8 @@
         >>> test_logger.addHandler(logging.StreamHandler(sys.stdout))
         >>> log('其他logger',logger=test_logger, level='error')  # 除了使用log模块默认logger之外还可以使用其他logger
         [<input>:1] 其他logger
+        >>> log('响应: %s', args=(response,))  # 延迟格式化，日志级别没有开启的时候不会格式化
+        >>> log(lambda: f'响应: {pformat(response)}')  # 延迟生成日志内容，日志级别没有开启的时候不会调用
 
         + log_instance用法
 
@@ -83,15 +85,27 @@
         >>> backup_count=const.backup_count, # 用户从ini获取其他配置文件中读取的数据
         >>> logfile_level=const.log_level_in_logfile, # 用户从ini获取其他配置文件中读取的数据
         >>> display_to_console=const.console_log_on, # 用户从ini获取其他配置文件中读取的数据
+        >>> async_mode=const.log_async_mode, # 用户从ini获取其他配置文件中读取的数据
         >>> )
 
+        + 异步日志
+
+            async_mode=True的时候log()只在调用线程中生成日志记录并放入有界队列，pretty print、格式化输出、
+            日期格式化、颜色以及文件翻滚都在后台线程AsyncLogWriter中完成；队列满的时候最多等待queue_timeout秒，
+            仍然没有空间则丢弃该条日志并计数(log_instance.dropped)，进程退出的时候写完队列中剩余的日志
+
 """
+import atexit
+import copy
 import functools
 import logging
 import logging.handlers
 import os
+import queue
 import sys
 import threading
+import time
+from collections.abc import Mapping
 from logging.handlers import RotatingFileHandler, SysLogHandler
 from pprint import pformat
 
@@ -100,7 +114,7 @@ from colorama import Fore, init
 from library.conf import settings as const
 from library.decorator import SingletonMeta
 
-__all__ = ['log', 'log_instance', 'log_function_call']
+__all__ = ['log', 'log_instance', 'log_function_call', 'log_enabled']
 
 # init(autoreset=True)  # 初始化colorama，用于支持颜色显示和设置
 sys.stderr = sys.stdout  # 未配置root logger时候日志级别为 warning, 输入到stderr， 默认日志pycharm中默认设置stderr显示是红色字体
@@ -123,6 +137,17 @@ def _remove_internal_loggers(logger_to_update, display_to_console=False):
                 logger_to_update.removeHandler(handler)
 
 
+# {code object: 文件名}，同一个函数中的日志只需要计算一次文件名
+_code_basenames = {}
+
+
+def _basename(code):
+    name = _code_basenames.get(code)
+    if name is None:
+        name = _code_basenames[code] = os.path.basename(code.co_filename)
+    return name
+
+
 def _line(back=0):
     # noinspection PyProtectedMember
     return sys._getframe(back + 1).f_lineno
@@ -130,7 +155,7 @@ def _line(back=0):
 
 def _file(back=0):
     # noinspection PyProtectedMember
-    return os.path.basename(sys._getframe(back + 1).f_code.co_filename)
+    return _basename(sys._getframe(back + 1).f_code)
 
 
 def _pid():
@@ -141,6 +166,165 @@ def _pid():
 # -----------------------------------------------------------------------------------------------------------
 
 
+class _LogMessage(object):
+    """
+    log()的日志内容，callable的调用、%格式化、pretty print、backtrace前缀以及格式化输出在第一次转换成字符串的时候
+    才处理，异步日志的时候在后台线程中转换；
+    location为调用方的(code object, 行号)，文件名同样在输出的时候才计算，没有输出的日志不会计算
+    """
+    __slots__ = ('msg', 'args', 'location', 'pprint', 'format_print', '_text')
+
+    def __init__(self, msg, location=None, pprint=True, format_print=False, args=None):
+        if callable(msg):
+            pass
+        elif pprint and isinstance(msg, Mapping):
+            msg = copy.copy(msg)  # 后台线程格式化的时候调用方可能已经修改了原来的数据
+        elif not isinstance(msg, str):
+            msg = str(msg)
+        self.msg = msg
+        self.args = args
+        self.location = location
+        self.pprint = pprint
+        self.format_print = format_print
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            from .utils import print_format
+            _msg = self.msg
+            if callable(_msg):
+                _msg = _msg()
+            if self.args:
+                _msg = str(_msg) % self.args
+            if self.pprint and isinstance(_msg, Mapping):  # 只格式化Mapping类型的数据即可({})
+                _msg = pformat(_msg, width=60)
+                _msg = f"\n{'='*8}pretty message{'='*8}\n{_msg}\n{'='*30}"
+            if self.location:
+                code, lineno = self.location
+                _msg = f'[{_basename(code)}:{lineno}] {_msg}'
+            self._text = print_format(_msg) if self.format_print else _msg
+        return self._text
+
+
+def _emit(logger, record, color=None):
+    """
+    把日志记录交给logger的handler输出，color不为空的时候直接写入内部handler的stream，不带日志格式化前缀
+
+    :param logger: logger对象
+    :param record: LogRecord
+    :param color: 颜色
+    """
+    if color:
+        _msg = record.getMessage()
+        for handler in list(logger.handlers):
+            if hasattr(handler, const.INTERNAL_LOGGER_ATTR):
+                if isinstance(handler, logging.FileHandler):
+                    # 内部的FileHandler不能有颜色color,此处为hack直接从stream中写入，不带[D 18年10月18日 16时38分24秒,978毫秒]
+                    handler.stream.write(_msg + '\n')
+                elif isinstance(handler, logging.StreamHandler):
+                    __msg = f"{getattr(Fore, color.upper(), '')}{_msg}{Fore.RESET}"
+                    handler.stream.write(__msg + '\n')
+    else:
+        logger.handle(record)
+
+
+class AsyncLogWriter(object):
+    """
+    + 说明：
+        后台写日志的线程，log()把(logger, LogRecord, color)放入有界队列，由后台线程格式化并写入handler；
+        后台线程在第一次写入的时候启动，fork之后的子进程中重新创建队列和线程
+    """
+
+    def __init__(self, queue_size=10000, block_timeout=0.5):
+        """
+        :param queue_size: 队列长度上限
+        :param block_timeout: 队列满的时候最多等待的秒数，超时之后丢弃该条日志，0表示不等待
+        """
+        self.queue_size = int(queue_size or 0)
+        self.block_timeout = float(block_timeout or 0)
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._guard = threading.Lock()
+
+    def after_fork(self):
+        """fork之后子进程中没有后台线程，父进程中的队列和锁也不能继续使用"""
+        self._guard = threading.Lock()
+        self._queue = self._thread = self._pid = None
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            with self._guard:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(self.queue_size)
+                    self._thread = threading.Thread(target=self._run, args=(self._queue,), name='log-writer',
+                                                    daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    @staticmethod
+    def _run(q):
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                logger, record, color = item
+                if logger is None:  # flush
+                    record.set()
+                else:
+                    _emit(logger, record, color)
+            except Exception:  # 后台线程不能因为单条日志出错而退出
+                import traceback
+                traceback.print_exc(file=sys.__stderr__)
+            finally:
+                q.task_done()
+
+    def submit(self, logger, record, color=None):
+        """
+        :param logger: logger对象
+        :param record: LogRecord
+        :param color: 颜色
+        """
+        q = self._ensure_started()
+        try:
+            if self.block_timeout > 0:
+                q.put((logger, record, color), timeout=self.block_timeout)
+            else:
+                q.put_nowait((logger, record, color))
+        except queue.Full:
+            with self._guard:
+                self.dropped += 1
+
+    def flush(self, timeout=None):
+        """
+        :param timeout: 等待队列中已有日志写完的最长时间，None表示一直等待
+        :return: 是否在timeout之内写完
+        """
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put((None, done, None), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout=5):
+        """写完队列中的日志之后停止后台线程"""
+        if self._pid != os.getpid():
+            return
+        self.flush(timeout)
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._queue = self._thread = self._pid = None
+
+
 def safe_unicode(s):
     """
     将bytes, unicode, or None安全的转换成unicode
@@ -199,6 +383,10 @@ class LogFormatter(logging.Formatter):
         self._fmt = fmt
         self._colors = {}
         self._normal = ''
+        # (秒, 日期格式, 格式化之后的日期)，同一秒内的日志只调用一次strftime
+        self._time_cache = (None, None, None)
+        # {日期格式: unicode-escape之后的日期格式}，只记录strftime出现UnicodeEncodeError的格式
+        self._escaped_date_fmts = {}
 
         if color:
             self._colors = colors
@@ -207,19 +395,25 @@ class LogFormatter(logging.Formatter):
     def formatTime(self, record, date_fmt=None):
         """
         重载日期格式化,支持中文格式显示，以及毫秒显示
+        精确到秒的部分按秒缓存，只有秒数变化的时候才重新strftime
         """
-        import time
-        ct = self.converter(record.created)
-        if date_fmt:
+        date_fmt = date_fmt or self.default_time_format
+        second = int(record.created)
+        cached_second, cached_fmt, fmt_time = self._time_cache
+        if second != cached_second or date_fmt != cached_fmt:
+            fmt_time = self._strftime(date_fmt, self.converter(second))
+            self._time_cache = (second, date_fmt, fmt_time)
+        return f'{fmt_time},{int(record.msecs)}毫秒'
+
+    def _strftime(self, date_fmt, ct):
+        escaped = self._escaped_date_fmts.get(date_fmt)
+        if escaped is None:
             try:
-                fmt_time = time.strftime(date_fmt, ct)
+                return time.strftime(date_fmt, ct)
             except UnicodeEncodeError:  # python3.4/5/6版本中对中文字符进行strftime会出现UnicodeEncodeError，处理此处异常
-                # bug号为https: // bugs.python.org / issue8304
-                fmt_time = time.strftime(date_fmt.encode('unicode-escape').decode(), ct)
-                fmt_time = fmt_time.encode().decode('unicode-escape')
-            return f'{fmt_time},{record.msecs:.0f}毫秒'
-        else:
-            return f'{time.strftime(self.default_time_format, ct)},{record.msecs:.0f}毫秒'
+                # bug号为https: // bugs.python.org / issue8304，转义之后的格式只计算一次
+                escaped = self._escaped_date_fmts[date_fmt] = date_fmt.encode('unicode-escape').decode()
+        return time.strftime(escaped, ct).encode().decode('unicode-escape')
 
     def format(self, record):
 
@@ -260,14 +454,18 @@ class Log(metaclass=SingletonMeta):
         self._loglevel = logging.DEBUG  # 全局log level
         self._logfile = None
         self._formatter = None
+        self.writer = None  # 异步日志的AsyncLogWriter，None表示在调用线程中直接写日志
         self.logger = self.setup()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
 
     def reset(self):
         """setup()不传入参数就是reset"""
         self.logger = self.setup()
 
     def setup(self, name=None, log_file=None, console_level=logging.DEBUG, fmt=None, max_bytes=0, backup_count=0,
-              logfile_level=logging.DEBUG, display_to_console=True):
+              logfile_level=logging.DEBUG, display_to_console=True, async_mode=False, queue_size=10000,
+              queue_timeout=0.5):
         """
         日志设置基础函数
         如果要设置的日志name已经存在，使用旧的日志实例，如果没有重新创建
@@ -281,8 +479,12 @@ class Log(metaclass=SingletonMeta):
         :param backup_count: 翻滚文件个数
         :param logfile_level: RotatingFile Handler日志级别
         :param display_to_console:是否打印到Console
+        :param async_mode: 是否在后台线程中格式化和写入日志
+        :param queue_size: 异步日志队列长度上限
+        :param queue_timeout: 异步日志队列满的时候最多等待的秒数，超时之后丢弃该条日志
         :return:logger
         """
+        self.asynchronous(False)  # 修改handler之前写完队列中的日志
         _logger = logging.getLogger(name or __name__)  # 如果
         _logger.propagate = False  # 禁止propagate到handler
         _effective_level = min(logfile_level, console_level)
@@ -353,8 +555,58 @@ class Log(metaclass=SingletonMeta):
             self._logfile = log_file
         self._loglevel = _logger.getEffectiveLevel()
         logging.root = _logger
+        self.asynchronous(async_mode, queue_size, queue_timeout)
         return _logger
 
+    def asynchronous(self, enable=True, queue_size=10000, queue_timeout=0.5):
+        """
+        开启或者关闭异步日志，关闭的时候写完队列中剩余的日志
+
+        :param enable: 是否开启
+        :param queue_size: 队列长度上限
+        :param queue_timeout: 队列满的时候最多等待的秒数，超时之后丢弃该条日志
+        :return: None
+        """
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.stop()
+            if writer.dropped:
+                self.logger.warning(f'日志队列已满，丢弃了{writer.dropped}条日志')
+        if enable:
+            self.writer = AsyncLogWriter(queue_size, queue_timeout)
+
+    def emit(self, logger, record, color=None):
+        """
+        异步日志的时候放入队列，否则直接输出
+
+        :param logger: logger对象
+        :param record: LogRecord
+        :param color: 颜色
+        """
+        writer = self.writer
+        if writer is None:
+            _emit(logger, record, color)
+        else:
+            writer.submit(logger, record, color)
+
+    def flush(self, timeout=None):
+        """等待异步日志队列中已有的日志写完"""
+        if self.writer is not None:
+            self.writer.flush(timeout)
+
+    @property
+    def dropped(self):
+        """异步日志队列满的时候丢弃的日志数量"""
+        return self.writer.dropped if self.writer is not None else 0
+
+    def close(self):
+        """进程退出的时候写完异步日志队列中剩余的日志"""
+        self.asynchronous(False)
+
+    def _after_fork(self):
+        if self.writer is not None:
+            self.writer.after_fork()
+
     def formatter(self, fmt, force=False):
         """
         对默认logger的默认handler(logger中含有INTERNAL_LOGGER_ATTR属性的为True的handler)设置formatter
@@ -399,6 +651,7 @@ class Log(metaclass=SingletonMeta):
         :param log_level: 日志默认级别 优先级log_level > _loglevel
         :return: None
         """
+        self.flush()  # 修改handler之前写完队列中的日志
         # 如果内部RotatingFileHandler存在则移除
         _remove_internal_loggers(self.logger, display_to_console)
         if filename:
@@ -438,6 +691,7 @@ class Log(metaclass=SingletonMeta):
 
 
 log_instance = Log()
+atexit.register(log_instance.close)
 
 
 def log_function_call(func):
@@ -457,10 +711,37 @@ def log_function_call(func):
     return wrap
 
 
-def log(*msg, level='debug', format_print=False, log_file=None, logger=None, backtrace=1, pprint=True, color=None):
+def log_enabled(level='debug', logger=None):
     """
     + 说明：
-        生成指定级别的日志便捷函数
+        判断指定级别的日志是否会被输出（logger级别满足并且至少有一个handler的级别满足），
+        用于在拼接开销较大的日志内容之前提前判断
+
+    :param level: 日志等级
+    :param logger: logger对象，如果为空为默认log_instance
+    :return: True or False
+    """
+    logger = logger if logger else log_instance.logger
+    level_no = getattr(logging, str(level).upper())
+    if not logger.isEnabledFor(level_no):
+        return False
+    while logger:
+        if any(level_no >= handler.level for handler in logger.handlers):
+            return True
+        logger = logger.parent if logger.propagate else None
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def _level_no(level):
+    return getattr(logging, str(level).upper(), None)
+
+
+def log(*msg, level='debug', format_print=False, log_file=None, logger=None, backtrace=1, pprint=True, color=None,
+        args=None):
+    """
+    + 说明：
+        生成指定级别的日志便捷函数，日志级别没有开启的时候直接返回，不做任何格式化
 
     :param color: 通过设置颜色指定显示文字的颜色（大小写均可），但是不带日志格式化前缀
                   color可选范围如下
@@ -479,11 +760,13 @@ def log(*msg, level='debug', format_print=False, log_file=None, logger=None, bac
     :param log_file: 根据log_file生成新的log日志（输入:'test.log'则会在logs文件夹下面生成对应log，
                      如果输入‘E:/test/test.log’则在对应目录下面生成log，如果路径中的文件夹不存在，自动创建）
                      TODO:后续要根据log等级在串口输出不同颜色的log
-    :param msg: 日志信息
+    :param msg: 日志信息，可以是callable，在日志输出的时候才调用生成日志内容（异步日志的时候在后台线程中调用，
+                引用的数据在log()之后不应该再被修改）
     :param level: 日志等级
+    :param args: %格式化参数，日志输出的时候才执行msg % args
     :return: None
     """
-    _level = getattr(logging, str(level).upper(), None) if level else None  # level不为None的时候判断日志级是否为合法日志级别
+    _level = _level_no(level) if level else None  # level不为None的时候判断日志级是否为合法日志级别
 
     if _level is None:
         raise (ValueError, '日志级别非法或者为空')
@@ -491,26 +774,17 @@ def log(*msg, level='debug', format_print=False, log_file=None, logger=None, bac
     if log_file:
         log_instance.logfile(log_file)
 
+    logger = logger if logger else log_instance.logger
+    if not color and not logger.isEnabledFor(_level):
+        return
+    location = None
+    if backtrace:  # 打印 backtrace，每次调用只查找一次栈帧，行号需要在调用的时候记录
+        # noinspection PyProtectedMember
+        frame = sys._getframe(backtrace)
+        location = (frame.f_code, frame.f_lineno)
+        del frame
     for _msg in msg:
-        from .utils import print_format
-        from collections.abc import Mapping
-        if pprint and isinstance(_msg, Mapping):  # 只格式化Mapping类型的数据即可({})
-            _msg = pformat(_msg, width=60)
-            _msg = f"\n{'='*8}pretty message{'='*8}\n{_msg}\n{'='*30}"
-
-        if backtrace:  # 打印 backtrace
-            _msg = f'[{_file(backtrace)}:{_line(backtrace)}] {_msg}'
-
-        logger = logger if logger else log_instance.logger
-        _msg = print_format(_msg) if format_print else str(_msg)
-        if color:
-            for handler in list(logger.handlers):
-                if hasattr(handler, const.INTERNAL_LOGGER_ATTR):
-                    if isinstance(handler, logging.FileHandler):
-                        # 内部的FileHandler不能有颜色color,此处为hack直接从stream中写入，不带[D 18年10月18日 16时38分24秒,978毫秒]
-                        handler.stream.write(_msg + '\n')
-                    elif isinstance(handler, logging.StreamHandler):
-                        __msg = f"{getattr(Fore, color.upper(), '')}{_msg}{Fore.RESET}"
-                        handler.stream.write(__msg + '\n')
-        else:
-            getattr(logger, str(level).lower())(_msg)
+        # 日志内容的格式化延迟到handler输出的时候（异步日志的时候在后台线程中）
+        record = logger.makeRecord(logger.name, _level, '(unknown file)', 0,
+                                   _LogMessage(_msg, location, pprint, format_print, args), None, None)
+        log_instance.emit(logger, record, color)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# matcher.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/22 15:20  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    测试结果匹配引擎：sheet中预期的code/error_code编译成由选择器和比较组成的断言(Matcher)，
+    每行测试用例只编译一次，对响应只遍历一遍，返回唯一的Verdict(passed, reason)。
+
+    选择器为类似JSONPath的路径：
+        status                      响应中的status
+        result.count                响应中result字典的count
+        errors[*].status|code       errors列表中每个元素的status或者code（同一个元素中的多个字段用|分隔）
+        result.errors[0].index      result.errors列表中第一个元素的index
+
+    testcases中也可以直接使用：
+        self.assertTrue(*expect(response, code=private_status_codes.SUCCESSFUL_OPERATION))
+"""
+import re
+from collections.abc import Mapping
+from typing import NamedTuple
+
+# 批量操作接口返回错误列表的字段，例如{'status': 7, 'errors': [{'id': 14, 'status': 1}, {'id': 7, 'status': 163}]}
+ERROR_LIST_KEYS = ('errors', 'addErrors', 'delErrors', 'updateErrors')
+STEP_PATTERN = re.compile(r'^([^\[\]]+)(?:\[(\*|\d+)\])?$')
+
+
+class Verdict(NamedTuple):
+    """一行测试用例的判断结果"""
+    passed: bool
+    reason: str
+
+
+class Selector(object):
+    """
+    + 说明：
+        编译之后的选择器，select返回所有匹配到的值（生成器），路径不存在的时候不返回任何值
+    """
+    __slots__ = ('path', 'steps')
+
+    def __init__(self, path):
+        """
+        :param path: 选择器路径，例如errors[*].status|code
+        """
+        self.path = path
+        steps = []
+        parts = path.split('.')
+        for i, part in enumerate(parts):
+            if i == len(parts) - 1 and '|' in part:
+                steps.append(('fields', tuple(part.split('|')), None))
+                continue
+            match = STEP_PATTERN.match(part)
+            if match is None:
+                raise ValueError(f'非法的选择器 {path}')
+            key, index = match.groups()
+            steps.append(('key', key, None if index is None else (index if index == '*' else int(index))))
+        self.steps = tuple(steps)
+
+    def select(self, data):
+        """
+        :param data: 响应字典
+        :return: 匹配到的值的生成器
+        """
+        return self._select(data, 0)
+
+    def _select(self, value, depth):
+        if depth == len(self.steps):
+            yield value
+            return
+        kind, key, index = self.steps[depth]
+        if not isinstance(value, Mapping):
+            return
+        if kind == 'fields':
+            for field in key:
+                if field in value:
+                    yield value[field]
+            return
+        if key not in value:
+            return
+        value = value[key]
+        if index is None:
+            yield from self._select(value, depth + 1)
+        elif isinstance(value, list):
+            if index == '*':
+                for item in value:
+                    yield from self._select(item, depth + 1)
+            elif -len(value) <= index < len(value):
+                yield from self._select(value[index], depth + 1)
+
+    def __repr__(self):
+        return self.path
+
+
+class Predicate(object):
+    """断言基类"""
+    __slots__ = ()
+
+    def test(self, data):
+        raise NotImplementedError
+
+    def first_failure(self, data):
+        """
+        :param data: 响应字典
+        :return: 不满足的断言，全部满足返回None
+        """
+        return None if self.test(data) else self
+
+
+class Equals(Predicate):
+    """选择器匹配到的任意一个值等于预期值"""
+    __slots__ = ('selector', 'expected')
+
+    def __init__(self, path, expected):
+        self.selector = Selector(path)
+        self.expected = expected
+
+    def test(self, data):
+        expected = self.expected
+        return any(value == expected for value in self.selector.select(data))
+
+    def __str__(self):
+        return f'{self.selector} == {self.expected!r}'
+
+
+class Exists(Predicate):
+    """选择器至少匹配到一个值"""
+    __slots__ = ('selector',)
+
+    def __init__(self, path):
+        self.selector = Selector(path)
+
+    def test(self, data):
+        return any(True for _ in self.selector.select(data))
+
+    def __str__(self):
+        return f'{self.selector} exists'
+
+
+class IsInstance(Predicate):
+    """选择器匹配到的值为指定类型"""
+    __slots__ = ('selector', 'types')
+
+    def __init__(self, path, types):
+        self.selector = Selector(path)
+        self.types = types
+
+    def test(self, data):
+        return any(isinstance(value, self.types) for value in self.selector.select(data))
+
+    def __str__(self):
+        names = '/'.join(t.__name__ for t in (self.types if isinstance(self.types, tuple) else (self.types,)))
+        return f'{self.selector} is {names}'
+
+
+class Not(Predicate):
+    __slots__ = ('predicate', 'description')
+
+    def __init__(self, predicate, description=None):
+        self.predicate = predicate
+        self.description = description
+
+    def test(self, data):
+        return not self.predicate.test(data)
+
+    def __str__(self):
+        return self.description or f'not ({self.predicate})'
+
+
+class AllOf(Predicate):
+    __slots__ = ('predicates',)
+
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def test(self, data):
+        return all(predicate.test(data) for predicate in self.predicates)
+
+    def first_failure(self, data):
+        for predicate in self.predicates:
+            failure = predicate.first_failure(data)
+            if failure is not None:
+                return failure
+        return None
+
+    def __str__(self):
+        return ' and '.join(f'({predicate})' for predicate in self.predicates)
+
+
+class AnyOf(Predicate):
+    __slots__ = ('predicates',)
+
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def test(self, data):
+        return any(predicate.test(data) for predicate in self.predicates)
+
+    def __str__(self):
+        return ' or '.join(f'({predicate})' for predicate in self.predicates)
+
+
+class When(Predicate):
+    """条件满足的时候才检查then，否则视为通过"""
+    __slots__ = ('condition', 'then')
+
+    def __init__(self, condition, then):
+        self.condition = condition
+        self.then = then
+
+    def test(self, data):
+        return not self.condition.test(data) or self.then.test(data)
+
+    def first_failure(self, data):
+        return self.then.first_failure(data) if self.condition.test(data) else None
+
+    def __str__(self):
+        return f'if ({self.condition}) then ({self.then})'
+
+
+class Fail(Predicate):
+    """始终不通过"""
+    __slots__ = ('description',)
+
+    def __init__(self, description):
+        self.description = description
+
+    def test(self, data):
+        return False
+
+    def __str__(self):
+        return self.description
+
+
+class Matcher(object):
+    """
+    + 说明：
+        编译之后的预期结果，match返回唯一的Verdict
+    """
+    __slots__ = ('predicate', 'expected')
+
+    def __init__(self, predicate, expected):
+        """
+        :param predicate: 断言
+        :param expected: 预期结果描述，用于日志
+        """
+        self.predicate = predicate
+        self.expected = expected
+
+    def match(self, response):
+        """
+        :param response: SessionMethod返回的响应字典
+        :return: Verdict
+        """
+        if not isinstance(response, Mapping):
+            return Verdict(False, f'[{self.expected}] | [Actual Response: {response!r:.200}] 响应不是json')
+        actual = f'[{self.expected}] | [Actual Code: {response.get("status")}]'
+        failure = self.predicate.first_failure(response)
+        if failure is None:
+            return Verdict(True, actual)
+        return Verdict(False, f'{actual} Not Match: {failure}')
+
+    def __repr__(self):
+        return f'Matcher({self.predicate})'
+
+
+def _display_code(code):
+    return int(code) if isinstance(code, float) and code.is_integer() else code
+
+
+def compile_expectation(code="", error_code=""):
+    """
+    + 说明：
+        将sheet中的响应码code和错误检测码error_code编译成Matcher，判断规则同原有的Api.api():
+
+        1. code不为空：status等于code通过
+        2. code为空，error_code不为空：status不为0，并且
+           响应中errors/addErrors/delErrors/updateErrors为列表的时候，其中某个元素的status或者code等于error_code；
+           响应中有result的时候，result为字典，并且result.count等于error_code，或者error_code为'errors'且存在result.errors，
+           或者result.errors中某个元素的index或者code等于error_code。
+           以上字段都不存在的时候视为通过
+        3. 其他情况不通过
+
+    :param code: 响应码
+    :param error_code: 错误检测码
+    :return: Matcher
+    """
+    if code != "":
+        return Matcher(Equals('status', code), f'Except Code: {_display_code(code)}')
+    if error_code == "":
+        return Matcher(Fail('code和error_code都为空'), 'Except Code: ')
+
+    checks = [Not(Equals('status', 0), 'status为0，功能问题导致测试失败')]
+    for key in ERROR_LIST_KEYS:
+        checks.append(When(IsInstance(key, list), Equals(f'{key}[*].status|code', error_code)))
+    result_matches = [Equals('result.count', error_code)]
+    if error_code == 'errors':
+        result_matches.append(Exists('result.errors'))
+    result_matches.append(Equals('result.errors[*].index|code', error_code))
+    checks.append(When(Exists('result'), AllOf(IsInstance('result', Mapping), AnyOf(*result_matches))))
+    return Matcher(AllOf(*checks), f'Except ErrorCode: {_display_code(error_code)}')
+
+
+def expect(response, code="", error_code=""):
+    """
+    + 说明：
+        testcases中使用的便捷函数，规则同compile_expectation
+
+    :param response: 响应字典
+    :param code: 响应码
+    :param error_code: 错误检测码
+    :return: Verdict，可以直接self.assertTrue(*expect(...))
+    """
+    return compile_expectation(code, error_code).match(response)
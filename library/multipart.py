@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# multipart.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/22 09:45  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    流式multipart/form-data上传：
+
+    1. MultipartEncoder是一个带长度的file-like对象，作为data传给requests之后按块读取发送，
+       不需要把整个multipart请求体拼接到内存中，同时记录上传字节数和耗时
+    2. upload_cache按照文件路径缓存只读mmap，打开文件之后立刻关闭文件句柄，
+       同一个文件导入到多个测试用例的时候不会重复读取磁盘；文件的mtime或者大小变化之后重新映射，进程退出的时候统一关闭
+"""
+import atexit
+import mmap
+import os
+import threading
+import time
+import uuid
+
+from library.decorator import SingletonMeta
+from library.log import log
+
+
+class UploadCache(metaclass=SingletonMeta):
+    """
+    + 说明：
+        上传文件的只读mmap缓存
+
+        hits：直接使用已经映射的文件的次数
+        misses：需要重新映射文件的次数
+    """
+
+    def __init__(self):
+        self._sources = {}  # {文件绝对路径: (mtime, size, mmap或者b'')}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def source(self, file_path):
+        """
+        :param file_path: 上传文件路径
+        :return: 文件内容，非空文件为mmap对象，空文件为b''
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._sources.get(path)
+            if entry is not None and entry[:2] == (stat.st_mtime, stat.st_size):
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            with open(path, 'rb') as f:
+                content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+            # 旧的mmap可能还在被其他线程的上传使用，不主动关闭，由垃圾回收释放
+            self._sources[path] = (stat.st_mtime, stat.st_size, content)
+            return content
+
+    def close(self):
+        """关闭所有mmap"""
+        with self._lock:
+            for _, _, content in self._sources.values():
+                if isinstance(content, mmap.mmap):
+                    content.close()
+            self._sources.clear()
+
+
+upload_cache = UploadCache()
+atexit.register(upload_cache.close)
+
+
+class MultipartEncoder(object):
+    """
+    + 说明：
+        流式multipart/form-data编码器，用法：
+
+        encoder = MultipartEncoder({'file': ('users.csv', upload_cache.source(path)), 'type': '1'})
+        session.post(url, data=encoder, headers={'Content-Type': encoder.content_type})
+    """
+
+    def __init__(self, fields, boundary=None):
+        """
+        :param fields: {字段名: 值}，普通字段的值为str或者bytes，
+                       文件字段的值为(文件名, 内容)或者(文件名, 内容, Content-Type)，内容为bytes或者mmap
+        :param boundary: multipart边界，默认随机生成
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self._segments = []
+        for name, value in fields.items():
+            if isinstance(value, (tuple, list)):
+                file_name, content = value[0], value[1]
+                header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; ' \
+                         f'filename="{file_name}"\r\n'
+                if len(value) > 2 and value[2]:
+                    header += f'Content-Type: {value[2]}\r\n'
+            else:
+                content = value
+                header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n'
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            self._segments.extend([(header + '\r\n').encode('utf-8'), content, b'\r\n'])
+        self._segments.append(f'--{self.boundary}--\r\n'.encode('utf-8'))
+        self.length = sum(len(segment) for segment in self._segments)
+        self.seek(0)
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        chunk = self.read(64 * 1024)
+        while chunk:
+            yield chunk
+            chunk = self.read(64 * 1024)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """只支持回到开头，用于会话过期之后重发请求"""
+        if offset or whence != os.SEEK_SET:
+            raise ValueError('MultipartEncoder只支持seek(0)')
+        self._index = 0
+        self._offset = 0
+        self._position = 0
+        self.start_time = None
+        self.end_time = None
+
+    def read(self, size=-1):
+        """
+        :param size: 读取的字节数，小于0表示读取剩余的所有内容
+        :return: bytes
+        """
+        if self.start_time is None:
+            self.start_time = time.time()
+        remaining = self.length - self._position if size is None or size < 0 else size
+        chunks = []
+        while remaining > 0 and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            chunk = segment[self._offset:self._offset + remaining]
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            self._offset += len(chunk)
+            if self._offset >= len(segment):
+                self._index += 1
+                self._offset = 0
+        data = b''.join(chunks)
+        self._position += len(data)
+        if self._position >= self.length and self.end_time is None:
+            self.end_time = time.time()
+        return data
+
+    def log_throughput(self, name=''):
+        """
+        :param name: 上传的文件名称，用于日志显示
+        """
+        if self.start_time is None:
+            return
+        seconds = (self.end_time or time.time()) - self.start_time
+        speed = self._position / seconds / 1024 / 1024 if seconds else 0
+        log(f'上传{name} {self._position}/{self.length} bytes，耗时{seconds:.3f}秒，{speed:.2f} MB/s', level='info')
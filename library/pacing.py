@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# pacing.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/23 14:30  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    请求节奏控制，代替每个测试用例执行之前固定的sleep：
+
+    1. 每个目标host一个令牌桶，速率为PACING_RATE（每秒请求数，0表示不限制），桶容量为PACING_BURST，
+       令牌足够的时候请求不等待，只有超过速率的请求才会等待
+    2. PACING_ADAPTIVE开启的时候按照AIMD调整速率：响应为5xx/429、连接失败或者响应时间超过PACING_LATENCY_TARGET_MS，
+       速率减半（不低于PACING_MIN_RATE，每秒最多减一次）；其他响应每秒把速率增加约1，直到PACING_RATE
+
+    client.HttpSession、asyncclient.AsyncHttpSession以及会话池中的httpsession.PooledSession（sheet中的测试用例）
+    在发送请求之前调用pacer.delay获取需要等待的时间，收到响应之后调用pacer.feedback。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from library.conf import settings
+from library.decorator import SingletonMeta
+from library.log import log
+
+
+class HostBucket(object):
+    """
+    + 说明：
+        单个host的令牌桶，令牌不足的时候预支令牌并返回需要等待的时间，同步和异步客户端都可以使用
+    """
+
+    def __init__(self, host, rate, burst=None, min_rate=1.0, latency_target_ms=0, adaptive=False):
+        """
+        :param host: 目标host
+        :param rate: 每秒请求数上限，0表示不限制
+        :param burst: 桶容量，默认为1秒的令牌数
+        :param min_rate: 自适应调整的速率下限
+        :param latency_target_ms: 响应时间超过该值视为过载，0表示不检查响应时间
+        :param adaptive: 是否按照响应自动调整速率
+        """
+        self.host = host
+        self.ceiling = float(rate or 0)
+        self.rate = self.ceiling
+        self.capacity = float(burst or max(self.ceiling, 1))
+        self.min_rate = min(float(min_rate or 1), self.ceiling) if self.ceiling else 0
+        self.latency_target_ms = float(latency_target_ms or 0)
+        self.adaptive = adaptive and self.ceiling > 0
+        self.tokens = self.capacity
+        self.timestamp = time.monotonic()
+        self.last_decrease = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.decreases = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        :return: 发送请求之前需要等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            delay = -self.tokens / self.rate
+            self.waits += 1
+            self.wait_seconds += delay
+            return delay
+
+    def acquire(self, deadline=None):
+        """
+        + 说明：
+            同步获取一个令牌，令牌不足的时候sleep，例如压力测试中所有虚拟用户共用一个令牌桶控制整体每秒请求数
+
+        :param deadline: time.time()表示的截止时间，在截止时间之前拿不到令牌返回False
+        :return: True or False
+        """
+        delay = self.reserve()
+        if deadline is not None and time.time() + delay >= deadline:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def feedback(self, response_time_ms, overloaded):
+        """
+        :param response_time_ms: 响应时间，单位是毫秒
+        :param overloaded: 服务器是否返回了过载的响应（5xx/429/连接失败）
+        """
+        if not self.adaptive:
+            return
+        if self.latency_target_ms and response_time_ms > self.latency_target_ms:
+            overloaded = True
+        with self._lock:
+            now = time.monotonic()
+            if overloaded:
+                # 并发请求会同时收到多个过载响应，每秒最多减速一次
+                if now - self.last_decrease >= 1:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self.last_decrease = now
+                    self.decreases += 1
+                    log(f'{self.host}过载，请求速率降低到{self.rate:.1f}/s', level='warning')
+            elif self.rate < self.ceiling:
+                self.rate = min(self.ceiling, self.rate + 1 / self.rate)
+
+
+class Pacer(metaclass=SingletonMeta):
+    """
+    + 说明：
+        按照host管理令牌桶，配置在第一次请求某个host的时候读取
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._guard = threading.Lock()
+        self.enabled = True
+
+    def bucket(self, url):
+        """
+        :param url: 请求的完整url
+        :return: url对应host的HostBucket
+        """
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            with self._guard:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    bucket = self._buckets[host] = HostBucket(
+                        host, settings.get('PACING_RATE'), settings.get('PACING_BURST'),
+                        settings.get('PACING_MIN_RATE'), settings.get('PACING_LATENCY_TARGET_MS'),
+                        bool(settings.get('PACING_ADAPTIVE')))
+        return bucket
+
+    def delay(self, url):
+        """
+        :param url: 请求的完整url
+        :return: 发送请求之前需要等待的秒数
+        """
+        if not self.enabled:
+            return 0.0
+        return self.bucket(url).reserve()
+
+    def wait(self, url):
+        """同步客户端使用，令牌不足的时候sleep"""
+        delay = self.delay(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def feedback(self, url, response_time_ms, status_code):
+        """
+        :param url: 请求的完整url
+        :param response_time_ms: 响应时间，单位是毫秒
+        :param status_code: 响应状态码，连接失败为0
+        """
+        if self.enabled:
+            self.bucket(url).feedback(response_time_ms, status_code == 0 or status_code == 429
+                                      or status_code >= 500)
+
+    def reset(self):
+        """丢弃所有令牌桶，修改PACING_*配置之后调用"""
+        with self._guard:
+            self._buckets.clear()
+
+    @contextmanager
+    def suspended(self):
+        """在with块中不限制请求速率，例如压力测试自己控制RPS"""
+        enabled, self.enabled = self.enabled, False
+        try:
+            yield self
+        finally:
+            self.enabled = enabled
+
+    @property
+    def stats(self):
+        """
+        :return: {host: 统计信息}
+        """
+        return {host: {'rate': round(bucket.rate, 2), 'waits': bucket.waits,
+                       'wait_seconds': round(bucket.wait_seconds, 3), 'decreases': bucket.decreases}
+                for host, bucket in list(self._buckets.items())}
+
+
+pacer = Pacer()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# plan.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/18 10:12  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    将sheet编译成RowPlan列表，每一行测试用例只解析一次：
+    拼接好的完整url、str_eval之后的data、sheet中method对应的SessionMethod方法、导入导出文件以及编译好的预期检查点。
+
+    每张sheet在第一次使用的时候才编译，其他sheet中的错误不影响本sheet的执行。
+    编译结果保存在excel同目录下的.{excel名称}.plan文件中，key为excel内容、base_url以及导入导出规则的hash，
+    任意一项发生变化都会重新编译。
+"""
+import hashlib
+import os
+import pickle
+import threading
+from typing import NamedTuple
+
+from library.basesheetdata import workbook_cache
+from library.basicfunction import file_export, file_import
+from library.conf import settings
+from library.log import log
+from library.matcher import compile_expectation
+from library.sessionmethod import METHODS, SessionMethod
+from library.utils import str_eval
+
+# RowPlan的字段或者编译逻辑发生变化的时候需要修改，使得旧的.plan文件失效
+PLAN_VERSION = 2
+
+
+class RowPlan(NamedTuple):
+    """sheet中一行测试用例编译之后的结果，不可修改，data由SessionMethod.from_plan复制之后使用"""
+    seq: object
+    name: str
+    precondition: object
+    url: str
+    data: object
+    method: str
+    handler: object  # SessionMethod中的方法，method非法的时候为None
+    import_file: str
+    export_file: str
+    code: object
+    error_code: object
+    matcher: object  # code/error_code编译之后的library.matcher.Matcher
+
+
+def compile_row(seq, name, precondition, url, data, method, code, error_code):
+    """
+    + 说明：
+        编译sheet中的一行测试用例
+
+    :return: RowPlan
+    """
+    full_url = settings.base_url + url
+    handler = getattr(SessionMethod, METHODS[method]) if method in METHODS else None
+    return RowPlan(seq=seq, name=name, precondition=precondition, url=full_url, data=str_eval(data),
+                   method=method, handler=handler, import_file=file_import(f'{full_url}{int(seq)}'),
+                   export_file=file_export(f'{full_url}{int(seq)}'), code=code, error_code=error_code,
+                   matcher=compile_expectation(code, error_code))
+
+
+def compile_table(table):
+    """
+    :param table: basesheetdata.SheetTable
+    :return: sheet中所有测试用例的RowPlan
+    """
+    seq, name, precondition, url, data, method, _, code, error_code = table.columns
+    return tuple(compile_row(*row) for row in zip(seq, name, precondition, url, data, method, code, error_code))
+
+
+def _settings_fingerprint():
+    """影响编译结果的配置项"""
+    return repr((PLAN_VERSION, settings.base_url, settings.get('imports'), settings.get('exports')))
+
+
+def plan_cache_path(file_name):
+    """
+    :param file_name: excel文件路径
+    :return: 编译结果的保存路径
+    """
+    dir_name, base_name = os.path.split(os.path.abspath(file_name))
+    return os.path.join(dir_name, f'.{base_name}.plan')
+
+
+class PlanCache(object):
+    """
+    + 说明：
+        编译结果缓存，先查内存，再查磁盘上的.plan文件，都没有命中的时候才编译对应的sheet，
+        .plan文件中保存该excel已经编译过的所有sheet
+    """
+
+    def __init__(self):
+        self._plans = {}  # {excel绝对路径: ((mtime, size, 配置指纹), 内容hash, {sheet名称: (RowPlan, ...)})}
+        self._lock = threading.Lock()
+        self.compiled = 0
+        self.loaded = 0
+
+    def _entry(self, path):
+        stat = os.stat(path)
+        key = (stat.st_mtime, stat.st_size, _settings_fingerprint())
+        entry = self._plans.get(path)
+        if entry is None or entry[0] != key:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read() + key[2].encode('utf-8')).hexdigest()
+            plans = self._load(path, digest)
+            if plans is None:
+                plans = {}
+            else:
+                self.loaded += 1
+            entry = self._plans[path] = (key, digest, plans)
+        return entry
+
+    def sheet(self, file_name, sheet_name):
+        """
+        :param file_name: excel文件路径
+        :param sheet_name: sheet名称
+        :return: (RowPlan, ...)
+        """
+        path = os.path.abspath(file_name)
+        with self._lock:
+            _, digest, plans = self._entry(path)
+            if sheet_name not in plans:
+                # sheet不存在的时候workbook_cache.sheet抛出XLRDError
+                plans[sheet_name] = compile_table(workbook_cache.sheet(path, sheet_name))
+                self.compiled += 1
+                self._dump(path, digest, plans)
+            return plans[sheet_name]
+
+    @staticmethod
+    def _load(path, digest):
+        cache_file = plan_cache_path(path)
+        try:
+            with open(cache_file, 'rb') as f:
+                cached_digest, plans = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # 文件损坏或者RowPlan定义已经变化
+            log(f'{cache_file}读取失败，重新编译: {e}', level='warning')
+            return None
+        return plans if cached_digest == digest else None
+
+    @staticmethod
+    def _dump(path, digest, plans):
+        cache_file = plan_cache_path(path)
+        try:
+            with open(cache_file, 'wb') as f:
+                pickle.dump((digest, plans), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            log(f'{cache_file}保存失败: {e}', level='warning')
+
+    def clear(self):
+        """清空内存中的编译结果"""
+        with self._lock:
+            self._plans.clear()
+
+
+plan_cache = PlanCache()
+
+
+def compile_sheet(file_name, sheet_name):
+    """
+    :param file_name: excel文件路径
+    :param sheet_name: sheet名称
+    :return: sheet中所有测试用例的RowPlan
+    """
+    return plan_cache.sheet(file_name, sheet_name)
@@ -151,3 +151,71 @@ for number in codes:
 
     for label in codes[number]:
         locals()[label] = number
+
+
+class StatusCodeRegistry(object):
+    """
+    + 说明：
+        状态码注册表，import的时候根据codes构建一次：
+        状态码到(描述, 名称)的数组，以及名称到状态码的反向索引
+    """
+
+    def __init__(self, table):
+        """
+        :param table: {状态码: (描述, 名称)}，名称可以省略
+        """
+        self.entries = [None] * (max(table) + 1)
+        self.names = {}
+        for number, labels in table.items():
+            self.entries[number] = (labels[0], labels[1] if len(labels) > 1 else None)
+            for label in labels:
+                self.names[label] = number
+
+    def lookup(self, number):
+        """
+        :param number: 状态码，excel中读出的整数值float也可以
+        :return: (描述, 名称)，未知的状态码返回None
+        """
+        if isinstance(number, float) and number.is_integer():
+            number = int(number)
+        if type(number) is not int or not 0 <= number < len(self.entries):
+            return None
+        return self.entries[number]
+
+    def description(self, number):
+        """
+        :param number: 状态码
+        :return: 状态码描述，未知的状态码返回None
+        """
+        entry = self.lookup(number)
+        return entry[0] if entry else None
+
+    def code(self, name):
+        """
+        :param name: 状态码名称或者描述，例如SESSION_USER_NOT_FOUND
+        :return: 状态码，未知的名称返回None
+        """
+        return self.names.get(name)
+
+    def annotate(self, resp_json, text=False):
+        """
+        + 说明：
+            将响应中顶层的status替换成带描述的状态码，只浅拷贝顶层字典，不复制其他数据
+
+        :param resp_json: 接口返回的json
+        :param text: False替换成(0, '操作成功')，True替换成'0(操作成功)'
+        :return: 替换之后的json，没有status或者状态码未知的时候原样返回
+        """
+        if not isinstance(resp_json, dict) or 'status' not in resp_json:
+            return resp_json
+        status = resp_json['status']
+        description = self.description(status)
+        if description is None:
+            return resp_json
+        annotated = dict(resp_json)
+        annotated['status'] = f'{status}({description})' if text else (status, description)
+        return annotated
+
+
+registry = StatusCodeRegistry(codes)
+annotate = registry.annotate
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# requestlog.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/26 10:40  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    结构化的请求记录，与文本日志console.log并存，只追加不翻滚，不会因为日志翻滚丢失请求详情：
+
+    1. <pid>.jsonl：每个请求一条紧凑的json记录，包括时间、测试用例id、sheet、seq、method、url、状态码、耗时(ms)、
+       请求/响应大小，以及响应内容在<pid>.bodies中的偏移量和长度
+    2. <pid>.idx：索引，每行为"状态码\\t测试用例id\\t记录在.jsonl中的偏移量"，查询的时候只扫描索引，
+       再按照偏移量读取匹配的记录，不需要加载整个记录文件
+    3. 文件在本次测试报告目录下的REQUEST_LOG_DIR中，每个进程（包括多进程执行的worker进程）写入自己的文件
+    4. 测试用例id以及sheet中的行由inject._handler和apitest.Api.run_row通过request_context设置
+
+    查询：
+        python -m library.requestlog <目录> --test test_007_device --status 5xx --min-ms 1000
+"""
+import argparse
+import atexit
+import contextvars
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from library.conf import settings
+from library.decorator import SingletonMeta
+
+current_test = contextvars.ContextVar('current_test', default='')
+current_row = contextvars.ContextVar('current_row', default=('', ''))  # (sheet, seq)
+
+
+@contextmanager
+def request_context(test=None, sheet=None, seq=None):
+    """
+    + 说明：
+        with块中发送的请求记录为指定测试用例或者sheet中的行
+
+    :param test: 测试用例id
+    :param sheet: sheet名称
+    :param seq: sheet中测试用例的编号
+    """
+    tokens = []
+    if test is not None:
+        tokens.append((current_test, current_test.set(test)))
+    if seq is not None:
+        tokens.append((current_row, current_row.set((sheet or '', str(seq)))))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def _size(body):
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:  # 生成器等没有长度的请求内容
+        return 0
+
+
+class RequestSink(metaclass=SingletonMeta):
+    """
+    + 说明：
+        请求记录文件，第一次记录的时候打开；fork之前写完缓冲区，子进程中重新打开自己的文件
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._pid = None
+        self._files = None  # (记录, 响应内容, 索引)
+        self._sizes = None  # [记录文件大小, 响应内容文件大小]
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self.flush, after_in_child=self._after_fork)
+
+    @staticmethod
+    def default_dir():
+        directory = settings.get('REQUEST_LOG_DIR') or 'requests'
+        report_path = settings.get('report_dir_path') or settings.get('DCN_TESTREPORT_PATH')
+        if os.path.isabs(directory) or not report_path:
+            return directory
+        return os.path.join(str(report_path), directory)
+
+    def _ensure_open(self):
+        if self._pid != os.getpid():
+            directory = self.default_dir()
+            os.makedirs(directory, exist_ok=True)
+            base = os.path.join(directory, str(os.getpid()))
+            self._files = tuple(open(base + ext, 'ab') for ext in ('.jsonl', '.bodies', '.idx'))
+            self._sizes = [self._files[0].seek(0, os.SEEK_END), self._files[1].seek(0, os.SEEK_END)]
+            self._pid = os.getpid()
+        return self._files
+
+    def _after_fork(self):
+        # 父进程中的文件已经在fork之前写完缓冲区，子进程中只丢弃引用
+        self._guard = threading.Lock()
+        self._pid = self._files = self._sizes = None
+
+    def record(self, method, url, response, response_time_ms, content_size, error=None):
+        """
+        + 说明：
+            client.HttpSession、asyncclient.AsyncHttpSession和httpsession.PooledSession在每个请求完成之后调用
+
+        :param method: 请求方法
+        :param url: 完整url
+        :param response: 响应
+        :param response_time_ms: 响应时间，单位是毫秒
+        :param content_size: 响应内容大小
+        :param error: 请求异常
+        """
+        if not settings.get('REQUEST_LOG_ON'):
+            return
+        sheet, seq = current_row.get()
+        test = current_test.get()
+        status = response.status_code or 0
+        # 只记录已经读取的响应内容，stream模式的响应不在这里读取
+        body = getattr(response, '_content', None)
+        if not isinstance(body, bytes) or not settings.get('REQUEST_LOG_BODIES'):
+            body = b''
+        record = {
+            'ts': round(time.time(), 3),
+            'test': test,
+            'sheet': sheet,
+            'seq': seq,
+            'method': method,
+            'url': url,
+            'status': status,
+            'ms': response_time_ms,
+            'request_size': _size(getattr(getattr(response, 'request', None), 'body', None)),
+            'response_size': content_size,
+            'body_offset': -1,
+            'body_size': len(body),
+            'error': str(error) if error else None,
+        }
+        with self._guard:
+            records, bodies, index = self._ensure_open()
+            if body:
+                record['body_offset'] = self._sizes[1]
+                bodies.write(body)
+                self._sizes[1] += len(body)
+            line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+            offset = self._sizes[0]
+            records.write(line)
+            self._sizes[0] += len(line)
+            index.write(f'{status}\t{test}\t{offset}\n'.encode('utf-8'))
+
+    def flush(self):
+        """写完缓冲区中的记录"""
+        with self._guard:
+            if self._files is not None and self._pid == os.getpid():
+                for f in self._files:
+                    f.flush()
+
+    def close(self):
+        with self._guard:
+            if self._files is not None and self._pid == os.getpid():
+                for f in self._files:
+                    f.close()
+            self._pid = self._files = self._sizes = None
+
+
+request_sink = RequestSink()
+atexit.register(request_sink.close)
+
+
+# ----------------查询---------------------------------------------------------------------
+def segments(path):
+    """
+    :param path: 记录目录，或者单个记录文件(.jsonl/.idx/.bodies)
+    :return: 记录文件去掉扩展名之后的路径列表
+    """
+    if os.path.isdir(path):
+        return sorted(file[:-len('.idx')] for file in glob.glob(os.path.join(path, '*.idx')))
+    return [os.path.splitext(path)[0]]
+
+
+def match_status(status, patterns):
+    """
+    :param status: 状态码字符串
+    :param patterns: 状态码列表，支持5xx/4xx这样的通配，0表示连接失败
+    :return: 是否匹配
+    """
+    return any(len(pattern) == len(status) and all(p in 'xX' or p == s for p, s in zip(pattern, status))
+               for pattern in patterns)
+
+
+def _same_seq(recorded, seq):
+    try:
+        return float(recorded) == float(seq)  # sheet中的编号可能读取为1.0
+    except ValueError:
+        return recorded == seq
+
+
+def query(path, test=None, status=None, min_ms=None, sheet=None, seq=None):
+    """
+    + 说明：
+        逐行扫描索引，状态码和测试用例id匹配之后再读取对应的记录
+
+    :param path: 记录目录或者记录文件
+    :param test: 测试用例id中包含的字符串
+    :param status: 状态码列表，支持5xx这样的通配
+    :param min_ms: 耗时下限，单位是毫秒
+    :param sheet: sheet名称
+    :param seq: sheet中测试用例的编号
+    :return: 匹配的记录，附加segment字段用于读取响应内容
+    """
+    for segment in segments(path):
+        with open(segment + '.idx', 'rb') as index, open(segment + '.jsonl', 'rb') as records:
+            for line in index:
+                record_status, test_id, offset = line.decode('utf-8').rstrip('\n').split('\t')
+                if status and not match_status(record_status, status):
+                    continue
+                if test and test not in test_id:
+                    continue
+                records.seek(int(offset))
+                record = json.loads(records.readline())
+                if min_ms is not None and record['ms'] < min_ms:
+                    continue
+                if sheet is not None and record['sheet'] != sheet:
+                    continue
+                if seq is not None and not _same_seq(record['seq'], seq):
+                    continue
+                record['segment'] = segment
+                yield record
+
+
+def read_body(record):
+    """
+    :param record: query返回的记录
+    :return: 响应内容，没有记录的时候为b''
+    """
+    if record['body_offset'] < 0:
+        return b''
+    with open(record['segment'] + '.bodies', 'rb') as f:
+        f.seek(record['body_offset'])
+        return f.read(record['body_size'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m library.requestlog', description='查询结构化请求记录')
+    parser.add_argument('path', help='记录目录（测试报告目录下的REQUEST_LOG_DIR）或者单个记录文件')
+    parser.add_argument('--test', help='测试用例id中包含的字符串，例如test_007_device')
+    parser.add_argument('--status', action='append', help='状态码，支持5xx这样的通配，可以指定多次')
+    parser.add_argument('--min-ms', type=float, help='只显示耗时不小于该值的请求，单位是毫秒')
+    parser.add_argument('--sheet', help='sheet名称')
+    parser.add_argument('--seq', help='sheet中测试用例的编号')
+    parser.add_argument('--limit', type=int, help='最多显示的记录数')
+    parser.add_argument('--body', action='store_true', help='同时显示响应内容')
+    args = parser.parse_args(argv)
+    records = query(args.path, args.test, args.status, args.min_ms, args.sheet, args.seq)
+    for record in islice(records, args.limit):
+        print(json.dumps(record, ensure_ascii=False))
+        if args.body:
+            print(read_body(record).decode('utf-8', errors='replace'))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# resultstore.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/25 09:30  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    测试结果库(sqlite)，保存每个测试用例以及sheet中每行测试用例最近一次的结果，用于只重新执行失败或者修改过的测试用例：
+
+    1. tests：测试用例id（去掉SORT_CASE编号）、结果(pass/fail/error/skip)、耗时
+    2. rows：excel、sheet、seq、结果、耗时、响应内容hash、该行内容(包括url)的hash，以及最近一次通过时该行内容的hash
+
+    执行模式RERUN_MODE（runtest.py的--failed-only/--failed-first/--changed-only）：
+        failed-only   只执行上一次失败的测试用例，sheet中只执行上一次失败的行
+        failed-first  上一次有失败的测试类先执行，其他测试类按照原有顺序执行
+        changed-only  sheet中只执行内容或者url在最近一次通过之后发生变化的行（以及没有通过过的行）；
+                      不是由sheet驱动的测试用例只执行没有通过过的
+
+    sheet中被选中的行依赖的预制条件行以及登录/登出行始终会执行，保证会话状态和前置数据与完整执行一致。
+"""
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unittest
+
+from library.basicfunction import assert_login, assert_login_out
+from library.conf import settings
+from library.decorator import SingletonMeta
+from library.executor import SEQ_PATTERN
+from library.log import log
+from library.unittest.history import test_key
+
+MODE_ALL = ''
+MODE_FAILED_ONLY = 'failed-only'
+MODE_FAILED_FIRST = 'failed-first'
+MODE_CHANGED_ONLY = 'changed-only'
+MODES = (MODE_ALL, MODE_FAILED_ONLY, MODE_FAILED_FIRST, MODE_CHANGED_ONLY)
+
+VERDICTS = ('pass', 'fail', 'error', 'skip')  # 下标同_TestResult中的状态
+FAILED = ('fail', 'error')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    mode TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tests (
+    test_id TEXT PRIMARY KEY,
+    class_name TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    duration REAL NOT NULL,
+    run_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS rows (
+    file_name TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    seq TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    response_hash TEXT,
+    row_hash TEXT NOT NULL,
+    green_hash TEXT,
+    run_id INTEGER,
+    PRIMARY KEY (file_name, sheet_name, seq)
+);
+"""
+
+
+def row_hash(plan):
+    """
+    :param plan: library.plan.RowPlan
+    :return: 一行测试用例内容的hash，包括完整url、请求数据、method、预期结果以及导入导出文件
+    """
+    content = (plan.seq, plan.name, plan.precondition, plan.url, plan.data, plan.method, plan.import_file,
+               plan.export_file, plan.code, plan.error_code)
+    return hashlib.sha1(repr(content).encode('utf-8')).hexdigest()
+
+
+def response_hash(response):
+    """
+    :param response: SessionMethod返回的响应
+    :return: 响应内容的hash
+    """
+    content = json.dumps(response, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def _sheet_key(file_name):
+    return os.path.basename(str(file_name))
+
+
+class ResultStore(metaclass=SingletonMeta):
+    """
+    + 说明：
+        测试结果库，连接在第一次使用的时候打开；fork之后的worker进程重新打开自己的连接
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._pid = None
+        self._rlock = threading.RLock()
+        self.run_id = None
+
+    @staticmethod
+    def default_path():
+        file_name = settings.get('RESULT_STORE_FILE') or 'results.sqlite3'
+        report_path = settings.get('DCN_TESTREPORT_PATH')
+        if os.path.isabs(file_name) or not report_path:
+            return file_name
+        return os.path.join(str(report_path), file_name)
+
+    @property
+    def mode(self):
+        return settings.get('RERUN_MODE') or MODE_ALL
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            path = self.default_path()
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # worker进程同时写入的时候等待锁
+            self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._connection.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def start_run(self):
+        """
+        :return: 本次执行的run_id
+        """
+        with self._rlock:
+            cursor = self.connection.execute('INSERT INTO runs (started, mode) VALUES (?, ?)',
+                                             (time.time(), self.mode))
+            self.connection.commit()
+            self.run_id = cursor.lastrowid
+            return self.run_id
+
+    def flush(self):
+        """提交还没有写入的结果"""
+        with self._rlock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.commit()
+
+    def close(self):
+        with self._rlock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.commit()
+                self._connection.close()
+            self._connection = None
+
+    # ----------------测试用例---------------------------------------------------------------
+    def record_tests(self, case_results):
+        """
+        :param case_results: _TestResult.result，[(state, test, output, exc, run_time), ...]
+        """
+        records = [(test_key(test), f'{test.__class__.__module__}.{test.__class__.__qualname__}', VERDICTS[state],
+                    run_time, self.run_id)
+                   for state, test, _, _, run_time in case_results if hasattr(test, '_testMethodName')]
+        with self._rlock:
+            self.connection.executemany('INSERT OR REPLACE INTO tests VALUES (?, ?, ?, ?, ?)', records)
+            self.connection.commit()
+
+    def test_verdicts(self):
+        """
+        :return: {测试用例key(history.test_key): 最近一次的结果}
+        """
+        with self._rlock:
+            return dict(self.connection.execute('SELECT test_id, verdict FROM tests'))
+
+    def select_tests(self, suite):
+        """
+        + 说明：
+            按照RERUN_MODE过滤或者重新排列测试用例
+
+        :param suite: TestSuite
+        :return: TestSuite
+        """
+        mode = self.mode
+        if mode == MODE_ALL:
+            return suite
+        from library.unittest.parallel import group_by_class  # 延迟导入，防止循环导入
+        verdicts = self.test_verdicts()
+        groups = group_by_class(suite)
+        if mode == MODE_FAILED_FIRST:
+            failed = [(cls, tests) for cls, tests in groups if any(verdicts.get(test_key(t)) in FAILED for t in tests)]
+            groups = failed + [group for group in groups if group not in failed]
+        elif mode == MODE_FAILED_ONLY:
+            groups = [(cls, [t for t in tests if verdicts.get(test_key(t)) in FAILED]) for cls, tests in groups]
+        else:
+            groups = [(cls, [t for t in tests if self._sheet_driven(t) or verdicts.get(test_key(t)) != 'pass'])
+                      for cls, tests in groups]
+        selected = unittest.TestSuite(test for _, tests in groups for test in tests)
+        log(f'{mode}: 选中{selected.countTestCases()}/{suite.countTestCases()}个测试用例', level='info')
+        return selected
+
+    @staticmethod
+    def _sheet_driven(test):
+        """testcase目录中通过@run()执行sheet的测试用例，excel为配置中的<模块名>"""
+        return bool(settings.get(test.__class__.__module__.rsplit('.', 1)[-1]))
+
+    # ----------------sheet中的测试用例--------------------------------------------------------
+    def record_row(self, file_name, sheet_name, plan, passed, duration, response):
+        """
+        + 说明：
+            只在CoreTestRunner执行（start_run之后）的时候记录，压测(library.load)中重复执行的行不记录
+
+        :param file_name: excel文件路径
+        :param sheet_name: sheet名称
+        :param plan: library.plan.RowPlan
+        :param passed: 是否通过
+        :param duration: 耗时，单位是秒
+        :param response: 响应内容
+        """
+        if self.run_id is None:
+            return
+        current = row_hash(plan)
+        with self._rlock:
+            self.connection.execute(
+                'INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (file_name, sheet_name, seq) DO UPDATE SET passed = excluded.passed, '
+                'duration = excluded.duration, response_hash = excluded.response_hash, row_hash = excluded.row_hash, '
+                'green_hash = COALESCE(excluded.green_hash, rows.green_hash), run_id = excluded.run_id',
+                (_sheet_key(file_name), sheet_name, str(plan.seq), int(passed), duration, response_hash(response),
+                 current, current if passed else None, self.run_id))
+
+    def select_rows(self, file_name, sheet_name, plans):
+        """
+        + 说明：
+            按照RERUN_MODE选择sheet中需要执行的行，被选中的行依赖的预制条件行以及登录/登出行同时保留，
+            压测（没有start_run）的时候执行全部行
+
+        :param file_name: excel文件路径
+        :param sheet_name: sheet名称
+        :param plans: RowPlan列表
+        :return: 需要执行的RowPlan列表
+        """
+        mode = self.mode
+        if mode not in (MODE_FAILED_ONLY, MODE_CHANGED_ONLY) or self.run_id is None:
+            return plans
+        with self._rlock:
+            stored = {seq: (passed, green) for seq, passed, green in self.connection.execute(
+                'SELECT seq, passed, green_hash FROM rows WHERE file_name = ? AND sheet_name = ?',
+                (_sheet_key(file_name), sheet_name))}
+        wanted = set()
+        for plan in plans:
+            passed, green = stored.get(str(plan.seq), (None, None))
+            if mode == MODE_FAILED_ONLY and passed == 0 or mode == MODE_CHANGED_ONLY and green != row_hash(plan):
+                wanted.add(float(plan.seq))
+        if not wanted:
+            return []
+        by_seq = {float(plan.seq): plan for plan in plans}
+        pending = list(wanted)
+        while pending:
+            plan = by_seq.get(pending.pop())
+            if plan is None or plan.precondition in ('', None):
+                continue
+            for seq in {float(s) for s in SEQ_PATTERN.findall(str(plan.precondition))}:
+                if seq in by_seq and seq not in wanted:
+                    wanted.add(seq)
+                    pending.append(seq)
+        last = max(wanted)
+        return [plan for plan in plans if float(plan.seq) in wanted
+                or float(plan.seq) < last and (assert_login(plan.url) or assert_login_out(plan.url))]
+
+
+result_store = ResultStore()
+atexit.register(result_store.close)
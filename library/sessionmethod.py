@@ -18,16 +18,29 @@
 #
 # *********************************************************************
 import json
+import os
 from copy import deepcopy
 
-import requests
+from requests.compat import chardet
 
-from library.basicfunction import assert_login, assert_login_out, default_testfile_path, file_export, file_import
-from library.httpsession import http_session_admin, http_session_general_admin, http_session_user
-from library.log import log
-from library.private_status_codes import codes as dcn_codes
+from library.basicfunction import (
+    assert_login, assert_login_out, default_testfile_path, file_export, file_import, save_stream
+)
+from library.httpsession import http_session_admin, http_session_general_admin, http_session_no_login, http_session_user
+from library.log import log, log_enabled
+from library.multipart import MultipartEncoder, upload_cache
+from library.private_status_codes import annotate
 from library.utils import omit_long_data, str_eval
 
+# sheet表中method列的值到SessionMethod方法名称的映射
+METHODS = {
+    "post": "post", "get": "get", "put": "put", "delete": "delete", "head": "head", "patch": "patch",
+    "option": "option", "postuser": "post_user", "getuser": "get_user", "putuser": "put_user",
+    "deleteuser": "delete_user", "postadmin": "post_admin", "getadmin": "get_admin", "putadmin": "put_admin",
+    "deleteadmin": "delete_admin", "postnologin": "post_no_login", "getnologin": "get_no_login",
+    "putnologin": "put_no_login", "deletenologin": "delete_no_login"
+}
+
 
 class SessionMethod(object):
     """Session Method"""
@@ -45,6 +58,22 @@ class SessionMethod(object):
         self.file_import_path = file_import(f'{self.url}{int(self.seq)}')
         self.file_export_path = file_export(f'{self.url}{int(self.seq)}')
 
+    @classmethod
+    def from_plan(cls, plan):
+        """
+        根据编译好的RowPlan创建实例，不再重复解析data和导入导出文件，
+        data复制一份，请求过程中的修改不会影响缓存中的RowPlan
+        :param plan: library.plan.RowPlan
+        :return: SessionMethod实例
+        """
+        api = cls.__new__(cls)
+        api.url = plan.url
+        api.data = deepcopy(plan.data)
+        api.seq = plan.seq
+        api.file_import_path = plan.import_file
+        api.file_export_path = plan.export_file
+        return api
+
     @staticmethod
     def safe_response_data(response):
         """
@@ -65,19 +94,19 @@ class SessionMethod(object):
         :param response_json_or_text: response json or text data
         :return:
         """
-        msg = "\n[输入]:\n"
-        msg += "> {method} {url}\n".format(method=method, url=self.url)
+        from pprint import pformat
+        # 只延迟pformat，响应在调用的时候浅拷贝一份（annotate替换status的时候已经复制），之后的修改不影响日志内容
         if isinstance(response_json_or_text, dict):
-            msg += "> kwargs: {kwargs}".format(kwargs=response_json_or_text.get('file') or self.data)
-            dcn_raw_code = dcn_codes.get(response_json_or_text['status'])
-            display_response = deepcopy(response_json_or_text)
-            if dcn_raw_code:
-                display_response['status'] = (display_response['status'], dcn_raw_code[0])
+            log("\n[输入]:\n> %s %s\n> kwargs: %s", level='info',
+                args=(method, self.url, response_json_or_text.get('file') or self.data))
+            if log_enabled('info'):
+                snapshot = annotate(response_json_or_text)
+                if snapshot is response_json_or_text:
+                    snapshot = dict(response_json_or_text)
+                log(lambda: f'\n[输出]:\n> response: {pformat(snapshot)}', level='info')
         else:
-            display_response = response_json_or_text
-        from pprint import pformat
-        log(msg, level='info')
-        log(f'\n[输出]:\n> response: {pformat(display_response)}', level='info')
+            log("\n[输入]:\n> %s %s\n", level='info', args=(method, self.url))
+            log(lambda: f'\n[输出]:\n> response: {pformat(response_json_or_text)}', level='info')
 
     def post(self, session=http_session_admin):
         """
@@ -88,10 +117,12 @@ class SessionMethod(object):
         :return: 返回post方法字典值
         """
         if self.file_import_path:
-            file = {'file': open(default_testfile_path(self.file_import_path), 'rb')}
-            j = session().post(self.url, files=file)
+            file_path = default_testfile_path(self.file_import_path)
+            encoder = MultipartEncoder({'file': (os.path.basename(file_path), upload_cache.source(file_path))})
+            j = session().post(self.url, data=encoder, headers={'Content-Type': encoder.content_type})
+            encoder.log_throughput(self.file_import_path)
         elif assert_login(self.url):
-            j = requests.post(self.url, json=self.data)
+            j = http_session_no_login().post(self.url, json=self.data)
         elif assert_login_out(self.url):
             j = session().post(self.url)
         else:
@@ -117,7 +148,7 @@ class SessionMethod(object):
         用于未登录用户相关测试
         :return: 返回post方法字典值
         """
-        j = requests.post(self.url, json=self.data)
+        j = http_session_no_login().post(self.url, json=self.data)
         response = self.safe_response_data(j)
         self.display(response)
         return response
@@ -128,16 +159,21 @@ class SessionMethod(object):
         函数做了判断，如果是需要导出的get方法，将get的内容到出到文件，如果不是，直接调用get方法
         :return: 返回get方法字典值
         """
-        j = session().get(self.url, params=self.data)
-        msg = f'\n=======content==========\n{j.content.decode(j.apparent_encoding)}'
         if self.file_export_path:
-            with open(default_testfile_path(self.file_export_path), 'wb') as f:
-                f.write(j.content)
-            res = j.status_code
+            with session().get(self.url, params=self.data, stream=True) as j:
+                size, sha1, preview, seconds = save_stream(j, default_testfile_path(self.file_export_path))
+                res = j.status_code
+            # 与Response.apparent_encoding相同的编码检测，只检测保留的文件开头，不读取整个文件
+            encoding = (chardet.detect(preview)['encoding'] if preview else None) or 'utf-8'
+            speed = size / seconds / 1024 / 1024 if seconds else 0
+            msg = (f'\n=======content==========\n{preview.decode(encoding, errors="replace")}'
+                   f'{"..." if size > len(preview) else ""}\n'
+                   f'=======file==========\n{self.file_export_path}: {size} bytes, sha1 {sha1}, {speed:.2f} MB/s')
             self.display(msg, method='GET')
             response = {"status": res}
             return response
         else:
+            j = session().get(self.url, params=self.data)
             response = self.safe_response_data(j)
             self.display(response, method='GET')
             return response
@@ -164,7 +200,7 @@ class SessionMethod(object):
         函数做了判断，如果是需要导入的post方法，打开需要导入的文件并导入，如果不是，就根据sheet中data内容调用post方法
         :return: 返回post方法字典值
         """
-        j = requests.get(self.url, params=self.data)
+        j = http_session_no_login().get(self.url, params=self.data)
         response = self.safe_response_data(j)
         self.display(response)
         return response
@@ -194,7 +230,7 @@ class SessionMethod(object):
         """
         :return: 返回字put方法典值
         """
-        j = requests.get(self.url, json=self.data)
+        j = http_session_no_login().get(self.url, json=self.data)
         response = self.safe_response_data(j)
         self.display(response)
         return response
@@ -224,7 +260,7 @@ class SessionMethod(object):
         """
         :return: 返回delete方法字典值
         """
-        j = requests.delete(self.url)
+        j = http_session_no_login().delete(self.url)
         response = self.safe_response_data(j)
         self.display(response)
         return response
@@ -21,19 +21,32 @@ import datetime
 import io
 import json
 import os
-import shutil
 import sys
 import time
 import unittest
+from urllib.parse import quote
 from xml.sax import saxutils
 
 from library.conf import settings as const
+from .spool import ReportSpool
 from .template import Template_mixin
 from ..log import log
 
 result_data = dict()
 result_data['testResult'] = []
 current_class_name = ""
+# 流式写入报告的时候用来切分模板的占位符
+REPORT_MARK = '\x00report\x00'
+
+# ZTest风格报告的模板在导入的时候按照${resultData}切分一次，生成报告的时候只写入前后两部分和测试数据
+ZTEST_DATA_MARK = r"${resultData}"
+ZTEST_SCRIPT_TAG = '<script type="text/javascript">'
+# 测试数据单独写入文件(ZTEST_REPORT_DATA_FILE)的时候，页面从该变量读取
+ZTEST_DATA_VARIABLE = 'window.ztestResultData'
+# 写入报告文件的缓冲区大小
+REPORT_CHUNK_SIZE = 1 << 16
+with open(os.path.join(os.path.dirname(__file__), "template.html"), encoding='utf-8') as _template:
+    ZTEST_PREFIX, ZTEST_SUFFIX = _template.read().split(ZTEST_DATA_MARK, 1)
 
 
 class OutputRedirect(object):
@@ -57,7 +70,7 @@ stderr_redirect = OutputRedirect(sys.stderr)
 
 
 class _TestResult(unittest.TestResult):
-    def __init__(self, verbosity=1):
+    def __init__(self, verbosity=1, spool=None):
         super().__init__(verbosity)
         self.outputBuffer = io.StringIO()
         self.raw_stdout = None
@@ -68,11 +81,55 @@ class _TestResult(unittest.TestResult):
         self.error_count = 0
         self.verbosity = verbosity
         self.result = []
+        # spool不为空的时候测试用例的输出和异常信息写入spool，result中只保留状态和耗时，offsets为对应的偏移量
+        self.spool = spool
+        self.offsets = []
         self._case_start_time = 0
         self._case_run_time = 0
+        # 顺序执行的时候统计每个测试类的耗时（包括setUpClass/tearDownClass），参见parallel.run_serial
+        self.class_times = {}
+        self._timed_class = None
+        self._class_start_time = 0
+        self._fixture_start_time = None  # 测试用例之外最近一次setUpModule/setUpClass等的开始时间
+        self._in_case = False
+
+    def _setupStdout(self):
+        # unittest在setUpModule/setUpClass/tearDownClass/tearDownModule前后调用_setupStdout/_restoreStdout
+        super()._setupStdout()
+        if not self._in_case:
+            self._fixture_start_time = time.time()
+
+    def _restoreStdout(self):
+        super()._restoreStdout()
+        if not self._in_case and self._timed_class is not None:
+            # 测试类的测试用例执行完之后第一次调用的是该测试类的tearDownClass
+            self._stop_class_timer(time.time())
+            self._fixture_start_time = None
+
+    def _stop_class_timer(self, stop_time):
+        cls = self._timed_class
+        self.class_times[cls] = self.class_times.get(cls, 0.0) + stop_time - self._class_start_time
+        self._timed_class = None
+
+    def finish_class_times(self):
+        """
+        :return: {测试类: 实际耗时}，包括setUpClass/tearDownClass
+        """
+        if self._timed_class is not None:
+            self._stop_class_timer(time.time())
+        return self.class_times
 
     def startTest(self, test):
         self._case_start_time = time.time()
+        if test.__class__ is not self._timed_class:
+            # 测试类的计时从它的setUpClass开始，没有执行setUpClass的时候从第一个测试用例开始
+            start_time = self._fixture_start_time or self._case_start_time
+            if self._timed_class is not None:
+                self._stop_class_timer(start_time)
+            self._timed_class = test.__class__
+            self._class_start_time = start_time
+        self._fixture_start_time = None
+        self._in_case = True
         super().startTest(test)
         stdout_redirect.fp = self.outputBuffer
         stderr_redirect.fp = self.outputBuffer
@@ -94,13 +151,30 @@ class _TestResult(unittest.TestResult):
         return result
 
     def stopTest(self, test):
+        self._in_case = False
         self.complete_output()
 
+    def _add_result(self, state, test, output, exc, run_time):
+        if self.spool is not None:
+            self.offsets.append(self.spool.append(test, output, exc))
+            output = exc = ''
+        self.result.append((state, test, output, exc, run_time))
+
+    def case_output(self, index):
+        """
+        :param index: 测试用例在result中的下标
+        :return: (输出, 异常信息)
+        """
+        if self.spool is not None:
+            return self.spool.read(self.offsets[index])
+        _, _, output, exc, _ = self.result[index]
+        return output, exc
+
     def addSuccess(self, test):
         self.success_count += 1
         super().addSuccess(test)
         output = self.complete_output()
-        self.result.append((0, test, output, '', self._case_run_time))
+        self._add_result(0, test, output, '', self._case_run_time)
 
     # noinspection PyProtectedMember
     def addError(self, test, err):
@@ -108,7 +182,7 @@ class _TestResult(unittest.TestResult):
         super().addError(test, err)
         _, _exc_str = self.errors[-1]
         output = self.complete_output()
-        self.result.append((2, test, output, _exc_str, self._case_run_time))
+        self._add_result(2, test, output, _exc_str, self._case_run_time)
         log(f"执行测试用例 {test._testMethodName if hasattr(test, '_testMethodName') else ''} 遇到错误", level='error')
         if const.SHOW_ERROR_TRACEBACK:
             log(_exc_str, level='error')
@@ -116,7 +190,7 @@ class _TestResult(unittest.TestResult):
     def addSkip(self, test, reason):
         self.skip_count += 1
         super().addSkip(test, reason)
-        self.result.append((3, test, "", "", 0.0))
+        self._add_result(3, test, "", "", 0.0)
 
     # noinspection PyProtectedMember
     def addFailure(self, test, err):
@@ -124,7 +198,7 @@ class _TestResult(unittest.TestResult):
         super().addFailure(test, err)
         _, _exc_str = self.failures[-1]
         output = self.complete_output()
-        self.result.append((1, test, output, _exc_str, self._case_run_time))
+        self._add_result(1, test, output, _exc_str, self._case_run_time)
         log(f'执行测试用例 {test._testMethodName} 失败 ', level='error')
         if const.SHOW_ERROR_TRACEBACK:
             log(_exc_str, level='error')
@@ -144,33 +218,108 @@ class CoreTestRunner(Template_mixin):
         # log(f'\n=======================项目初始化参数====================\n{const.format()}')
         log("开始进行测试", level='info')
 
-        result = _TestResult(self.verbosity)
-        test(result)
+        from library.resultstore import result_store
+        from .parallel import run_suite
+        # 报告写入文件的时候测试用例的输出缓存在报告旁边的spool文件中，生成报告之后删除
+        spool = ReportSpool(f'{self.report_file}.cases.jsonl') if self.report_file else None
+        result = _TestResult(self.verbosity, spool)
+        result_store.start_run()
+        expected, actual = run_suite(test, result, int(const.get('WORKERS') or 1), self.verbosity)
+        result_store.record_tests(result.result)
         self.stop_time = datetime.datetime.now()
-        self.generate_report(result)
-        log('Time Elapsed: {}'.format(self.stop_time - self.start_time), level='info')
-
-        if const.CREATE_ZTEST_STYLE_REPORT:
-            file = self.report_file
-            shutil.copy2(os.path.join(os.path.dirname(__file__), "template.html"), file)
-            with open(file, "r+", encoding='utf-8') as f:
-                content = f.read().replace(r"${resultData}", json.dumps(result_data, ensure_ascii=False, indent=4))
-                f.seek(0)
-                f.write(content)
+        result_data["expectedMakespan"] = None if expected is None else round(expected, 2)
+        result_data["actualMakespan"] = round(actual, 2)
+        try:
+            self.generate_report(result)
+            log('Time Elapsed: {}'.format(self.stop_time - self.start_time), level='info')
+
+            if const.CREATE_ZTEST_STYLE_REPORT:
+                self.generate_ztest_report(result)
+        finally:
+            if spool is not None:
+                spool.close()
 
     @staticmethod
     def sort_result(case_results):
         rmap = {}
         classes = []
-        for n, t, o, e, run_time in case_results:
-            cls = t.__class__
+        for case_result in case_results:
+            cls = case_result[1].__class__
             if cls not in rmap:
                 rmap[cls] = []
                 classes.append(cls)
-            rmap[cls].append((n, t, o, e, run_time))
+            rmap[cls].append(case_result)
         r = [(cls, rmap[cls]) for cls in classes]
         return r
 
+    def iter_cases(self, result):
+        """
+        + 说明：
+            按照测试类分组依次返回测试用例，输出和异常信息逐条从spool中读取
+
+        :param result: _TestResult
+        :return: (测试类编号, 测试类, 测试类中的测试用例结果, 测试用例编号, (state, test, output, exc, run_time))，
+                 测试类中的测试用例结果为[(state, test, output, exc, run_time, 下标), ...]，output和exc可能为空
+        """
+        indexed = [case_result + (index,) for index, case_result in enumerate(result.result)]
+        for cid, (cls, cls_results) in enumerate(self.sort_result(indexed)):
+            for tid, (n, t, _, _, run_time, index) in enumerate(cls_results):
+                o, e = result.case_output(index)
+                yield cid, cls, cls_results, tid, (n, t, o, e, run_time)
+
+    def generate_ztest_report(self, result):
+        """
+        + 说明：
+            ZTest风格的报告，测试数据使用紧凑格式逐条编码写入文件；
+            ZTEST_REPORT_DATA_FILE开启的时候测试数据写入报告旁边的<报告名>.data.js，页面通过<script src>加载
+
+        :param result: _TestResult
+        """
+        if not const.get('ZTEST_REPORT_DATA_FILE'):
+            with open(self.report_file, "w", encoding='utf-8', buffering=REPORT_CHUNK_SIZE) as f:
+                f.write(ZTEST_PREFIX)
+                self._write_result_data(f, result)
+                f.write(ZTEST_SUFFIX)
+            return
+        data_file = os.path.splitext(self.report_file)[0] + '.data.js'
+        head, script = ZTEST_PREFIX.rsplit(ZTEST_SCRIPT_TAG, 1)
+        with open(self.report_file, "w", encoding='utf-8') as f:
+            f.write(head)
+            f.write(f'<script src="{quote(os.path.basename(data_file))}"></script>\n')
+            f.write(ZTEST_SCRIPT_TAG + script + ZTEST_DATA_VARIABLE + ZTEST_SUFFIX)
+        with open(data_file, "w", encoding='utf-8', buffering=REPORT_CHUNK_SIZE) as f:
+            f.write(f'{ZTEST_DATA_VARIABLE} = ')
+            self._write_result_data(f, result)
+            f.write(';\n')
+
+    def _write_result_data(self, f, result):
+        """
+        + 说明：
+            result_data以及每个测试用例的数据依次编码写入，测试用例的输出逐条从spool中读取；
+            字符串中的</转义为<\\/，防止日志中的</script>提前结束页面中的脚本
+
+        :param f: 报告文件
+        :param result: _TestResult
+        """
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+        def write(value):
+            f.writelines(chunk.replace('</', '<\\/') for chunk in encoder.iterencode(value))
+
+        f.write('{')
+        for key, value in result_data.items():
+            if key != 'testResult':
+                write(key)
+                f.write(':')
+                write(value)
+                f.write(',')
+        f.write('"testResult":[')
+        for cid, cls, _, tid, (n, t, o, e, run_time) in self.iter_cases(result):
+            if cid or tid:
+                f.write(',')
+            write(self._case_data(cls, n, t, o, e, run_time))
+        f.write(']}')
+
     def get_report_attributes(self, result):
         start_time = str(self.start_time)[:19]
         duration = str(self.stop_time - self.start_time)
@@ -199,23 +348,43 @@ class CoreTestRunner(Template_mixin):
 
     def generate_report(self, result):
         report_attrs = self.get_report_attributes(result)
+        result_data["testPass"] = result.success_count
+        result_data["testAll"] = result.success_count + result.failure_count + result.error_count + result.skip_count
+        result_data["testFail"] = result.failure_count
+        result_data["testSkip"] = result.skip_count
+        if const.CREATE_BSTEST_STYLE_REPORT:
+            if self.stream:
+                self._write_report(lambda text: self.stream.write(text.encode('utf8')), report_attrs, result)
+            elif self.report_file:
+                file = self.report_file
+                with open(file, "wb") as f:
+                    self._write_report(lambda text: f.write(text.encode('utf8')), report_attrs, result)
+
+    def _write_report(self, write, report_attrs, result):
+        """
+        + 说明：
+            模板在测试用例列表的位置切开，测试用例逐行写入，不在内存中拼接整个报告
+
+        :param write: 写入字符串的函数
+        :param report_attrs: get_report_attributes的返回值
+        :param result: _TestResult
+        """
         generator = 'BSTestRunner'
         stylesheet = self._generate_stylesheet()
         heading = self._generate_heading(report_attrs)
-        report = self._generate_report(result)
-        output = self.HTML_TMPL % dict(
+        html_head, html_tail = (self.HTML_TMPL % dict(
             title=self.title,
             generator=generator,
             stylesheet=stylesheet,
             heading=heading,
-            report=report)
-        if const.CREATE_BSTEST_STYLE_REPORT:
-            if self.stream:
-                self.stream.write(output.encode('utf8'))
-            elif self.report_file:
-                file = self.report_file
-                with open(file, "wb") as f:
-                    f.write(output.encode('utf8'))
+            report=REPORT_MARK)).split(REPORT_MARK)
+        report_head, report_tail = self._generate_report(result).split(REPORT_MARK)
+        write(html_head)
+        write(report_head)
+        for row in self._generate_report_rows(result):
+            write(row)
+        write(report_tail)
+        write(html_tail)
 
     def _generate_stylesheet(self):
         return self.STYLESHEET_TMPL
@@ -236,59 +405,74 @@ class CoreTestRunner(Template_mixin):
         return heading
 
     def _generate_report(self, result):
-        rows = []
-        sorted_result = self.sort_result(result.result)
-        for cid, (cls, cls_results) in enumerate(sorted_result):
-            pass_num = fail_num = error_num = skip_num = 0
-            for case_state, *_ in cls_results:
-                if case_state == 0:
-                    pass_num += 1
-                elif case_state == 1:
-                    fail_num += 1
-                elif case_state == 2:
-                    error_num += 1
-                else:
-                    skip_num += 1
-
-            name = "{}.{}".format(cls.__module__, cls.__name__)
-            doc = cls.__doc__ and cls.__doc__.split("\n")[0] or ""
-            desc = doc and '%s: %s' % (name, doc) or name
-            global current_class_name
-            current_class_name = name
-
-            row = self.REPORT_CLASS_TMPL % dict(
-                style=error_num > 0 and 'text text-warning' or fail_num > 0 and 'text text-danger' or 'text '
-                                                                                                      'text-success',
-                desc=desc,
-                count=pass_num + fail_num + error_num + skip_num,
-                Pass=pass_num,
-                fail=fail_num,
-                error=error_num,
-                skip=skip_num,
-                cid='c%s' % (cid + 1),
-            )
-            rows.append(row)
-
-            for tid, (case_state, t, o, e, run_time) in enumerate(cls_results):
-                self._generate_report_test(rows, cid, tid, case_state, t, o, e, run_time)
-
         report = self.REPORT_TMPL % dict(
-            test_list=''.join(rows),
+            test_list=REPORT_MARK,
             count=str(result.success_count + result.failure_count + result.error_count + result.skip_count),
             Pass=str(result.success_count),
             fail=str(result.failure_count),
             error=str(result.error_count),
             skip=str(result.skip_count),
         )
+        return report
 
-        result_data["testPass"] = result.success_count
-        result_data["testAll"] = result.success_count + result.failure_count + result.error_count + result.skip_count
-        result_data["testFail"] = result.failure_count
-        result_data["testSkip"] = result.skip_count
+    def _generate_report_rows(self, result):
+        for cid, cls, cls_results, tid, (n, t, o, e, run_time) in self.iter_cases(result):
+            if tid == 0:
+                yield self._generate_report_class(cid, cls, cls_results)
+            yield self._generate_report_test(cid, tid, n, t, o, e, run_time)
+
+    def _generate_report_class(self, cid, cls, cls_results):
+        pass_num = fail_num = error_num = skip_num = 0
+        for case_state, *_ in cls_results:
+            if case_state == 0:
+                pass_num += 1
+            elif case_state == 1:
+                fail_num += 1
+            elif case_state == 2:
+                error_num += 1
+            else:
+                skip_num += 1
+
+        name = "{}.{}".format(cls.__module__, cls.__name__)
+        doc = cls.__doc__ and cls.__doc__.split("\n")[0] or ""
+        desc = doc and '%s: %s' % (name, doc) or name
+        global current_class_name
+        current_class_name = name
+
+        row = self.REPORT_CLASS_TMPL % dict(
+            style=error_num > 0 and 'text text-warning' or fail_num > 0 and 'text text-danger' or 'text '
+                                                                                              'text-success',
+            desc=desc,
+            count=pass_num + fail_num + error_num + skip_num,
+            Pass=pass_num,
+            fail=fail_num,
+            error=error_num,
+            skip=skip_num,
+            cid='c%s' % (cid + 1),
+        )
+        return row
 
-        return report
+    def _case_data(self, cls, n, t, o, e, run_time):
+        """
+        :return: ZTest风格报告中一个测试用例的数据
+        """
+        case_data = {}
+        case_data['className'] = "{}.{}".format(cls.__module__, cls.__name__)
+        case_data['methodName'] = t.id().split('.')[-1]
+        case_data['spendTime'] = "{:.2}S".format(run_time)
+        case_data['description'] = t.shortDescription() or ""
+        case_data['log'] = o + e
+        if self.STATUS[n] == "Pass":
+            case_data['status'] = "成功"
+        if self.STATUS[n] == "Fail":
+            case_data['status'] = "失败"
+        if self.STATUS[n] == "Error":
+            case_data['status'] = "错误"
+        if self.STATUS[n] == "Skip":
+            case_data['status'] = "跳过"
+        return case_data
 
-    def _generate_report_test(self, rows, class_id, case_id, n, t, o, e, run_time):
+    def _generate_report_test(self, class_id, case_id, n, t, o, e, run_time):
         has_output = bool(o or e)
         if n == 0:
             case_tr_id = "pt{}.{}".format(class_id + 1, case_id + 1)
@@ -310,23 +494,6 @@ class CoreTestRunner(Template_mixin):
             output=saxutils.escape(o + e),
         )
 
-        case_data = {}
-        global current_class_name
-        case_data['className'] = current_class_name
-        case_data['methodName'] = name
-        case_data['spendTime'] = "{:.2}S".format(run_time)
-        case_data['description'] = doc
-        case_data['log'] = o + e
-        if self.STATUS[n] == "Pass":
-            case_data['status'] = "成功"
-        if self.STATUS[n] == "Fail":
-            case_data['status'] = "失败"
-        if self.STATUS[n] == "Error":
-            case_data['status'] = "错误"
-        if self.STATUS[n] == "Skip":
-            case_data['status'] = "跳过"
-        result_data['testResult'].append(case_data)
-
         if self.STATUS[n] == "Pass":
             row = tmpl_pass % dict(
                 tid=case_tr_id,
@@ -346,4 +513,4 @@ class CoreTestRunner(Template_mixin):
                 status=self.STATUS[n],
             )
 
-        rows.append(row)
+        return row
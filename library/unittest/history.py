@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# history.py - 测试用例执行时间历史
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/24 16:40  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    保存每个测试用例和测试类的执行时间，多进程执行的时候按照预计时间从长到短分发测试类(LPT)：
+
+    1. 每次执行之后把测试用例和测试类的耗时写入DURATION_HISTORY_FILE（json），与历史值取平均，平滑偶发的波动
+    2. 没有历史记录的测试用例按照对应sheet的行数×DURATION_ROW_SECONDS估算（testcase目录中@run()驱动的测试用例），
+       找不到sheet的按照DURATION_DEFAULT估算
+    3. lpt_makespan按照LPT模拟各个worker的负载，得到预计的总耗时，执行完成之后和实际耗时一起输出
+"""
+import heapq
+import json
+import os
+import re
+
+from library.conf import settings
+from library.log import log
+
+# SORT_CASE开启之后测试方法名称为test_00012_xxx，编号会随着用例增减变化，历史记录中去掉编号
+CASE_ID_PATTERN = re.compile(r'\.test_\d{5}_')
+# 新的耗时在历史平均值中的权重
+SMOOTHING = 0.5
+
+
+def test_key(test):
+    """
+    :param test: 测试用例
+    :return: 历史记录中测试用例的key
+    """
+    return CASE_ID_PATTERN.sub('.test_', test.id())
+
+
+def class_key(cls):
+    """
+    :param cls: 测试类
+    :return: 历史记录中测试类的key
+    """
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+def sheet_rows(test):
+    """
+    + 说明：
+        testcase目录中的测试用例通过@run()执行sheet，sheet为配置中的<模块名>_<函数名>，excel为配置中的<模块名>
+
+    :param test: 测试用例
+    :return: 对应sheet的测试用例行数，找不到sheet返回None
+    """
+    module = test.__class__.__module__.rsplit('.', 1)[-1]
+    func = getattr(test, getattr(test, '_testMethodName', ''), None)
+    file_name = settings.get(module)
+    sheet_name = settings.get(f'{module}_{getattr(func, "__name__", "")}')
+    if not file_name or not sheet_name:
+        return None
+    try:
+        from library.basesheetdata import sheet_table  # 延迟导入，只有需要估算的时候才读取excel
+        return max(sheet_table(file_name, sheet_name).nrows - 1, 0)
+    except Exception as e:
+        log(f'读取{file_name}:{sheet_name}失败，无法估算执行时间: {e!r}', level='warning')
+        return None
+
+
+def lpt_makespan(durations, workers):
+    """
+    + 说明：
+        按照LPT把任务依次分给当前负载最小的worker
+
+    :param durations: 任务耗时列表
+    :param workers: worker数量
+    :return: 预计的总耗时（负载最大的worker的耗时）
+    """
+    loads = [0.0] * max(min(workers, len(durations)), 1)
+    for duration in sorted(durations, reverse=True):
+        heapq.heapreplace(loads, loads[0] + duration)
+    return max(loads)
+
+
+class DurationHistory(object):
+    """
+    + 说明：
+        测试用例执行时间历史，{"tests": {测试用例key: 秒}, "classes": {测试类key: {"seconds": 秒, "tests": 测试用例数}}}
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: 历史文件路径，默认为测试报告目录下的DURATION_HISTORY_FILE
+        """
+        self.path = path or self.default_path()
+        self.tests = {}
+        self.classes = {}
+        self.load()
+
+    @staticmethod
+    def default_path():
+        file_name = settings.get('DURATION_HISTORY_FILE') or 'duration_history.json'
+        report_path = settings.get('DCN_TESTREPORT_PATH')
+        if os.path.isabs(file_name) or not report_path:
+            return file_name
+        return os.path.join(str(report_path), file_name)
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                content = json.load(f)
+            self.tests = content.get('tests', {})
+            self.classes = content.get('classes', {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            log(f'执行时间历史{self.path}格式错误，重新记录: {e!r}', level='warning')
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.part', 'w', encoding='utf-8') as f:
+            json.dump({'tests': self.tests, 'classes': self.classes}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(self.path + '.part', self.path)
+
+    @staticmethod
+    def _smooth(old, seconds):
+        return round(seconds if old is None else old * (1 - SMOOTHING) + seconds * SMOOTHING, 3)
+
+    def estimate_test(self, test):
+        """
+        :param test: 测试用例
+        :return: 预计耗时，单位是秒
+        """
+        seconds = self.tests.get(test_key(test))
+        if seconds is not None:
+            return seconds
+        rows = sheet_rows(test)
+        if rows is not None:
+            return rows * float(settings.get('DURATION_ROW_SECONDS') or 0)
+        return float(settings.get('DURATION_DEFAULT') or 0)
+
+    def estimate_class(self, cls, tests):
+        """
+        :param cls: 测试类
+        :param tests: 需要执行的测试用例，只执行部分测试用例的时候按照测试用例估算
+        :return: 预计耗时，单位是秒
+        """
+        history = self.classes.get(class_key(cls))
+        if history and history.get('tests') == len(tests):
+            return history['seconds']
+        return sum(self.estimate_test(test) for test in tests)
+
+    def record(self, case_results, class_times=None):
+        """
+        + 说明：
+            记录一次执行的耗时并保存，跳过的测试用例不记录
+
+        :param case_results: _TestResult.result
+        :param class_times: {测试类: 实际耗时}，包括setUpClass/tearDownClass，由worker进程或者parallel.run_serial统计，
+                            没有的时候按照测试用例耗时之和计算
+        """
+        sums = {}
+        counts = {}
+        for state, test, _, _, run_time in case_results:
+            if not hasattr(test, '_testMethodName'):  # setUpClass/tearDownClass的错误
+                continue
+            counts[test.__class__] = counts.get(test.__class__, 0) + 1
+            sums[test.__class__] = sums.get(test.__class__, 0.0) + run_time
+            if state != 3:
+                key = test_key(test)
+                self.tests[key] = self._smooth(self.tests.get(key), run_time)
+        sums.update((cls, seconds) for cls, seconds in (class_times or {}).items() if cls in counts)
+        for cls, seconds in sums.items():
+            old = self.classes.get(class_key(cls)) or {}
+            # 测试用例数量变化之后历史耗时不再适用
+            self.classes[class_key(cls)] = {
+                'seconds': self._smooth(old.get('seconds') if old.get('tests') == counts[cls] else None, seconds),
+                'tests': counts[cls]}
+        try:
+            self.save()
+        except OSError as e:
+            log(f'保存执行时间历史{self.path}失败: {e!r}', level='warning')
@@ -18,11 +18,11 @@
 #
 # *********************************************************************
 import functools
-import time
 import unittest
 
 from library.conf import settings as const
 from library.log import log
+from library.requestlog import request_context
 Tag = const.Tag
 CASE_TAG_FLAG = "__case_tag__"
 CASE_DATA_FLAG = "__case_data__"
@@ -31,8 +31,9 @@ CASE_ID_FLAG = "__case_id__"
 CASE_INFO_FLAG = "__case_info__"
 CASE_SKIP_FLAG = "__unittest_skip__"
 CASE_SKIP_REASON_FLAG = "__unittest_skip_why__"
+CASE_EXCLUSIVE_FLAG = "__case_exclusive__"
 
-__all__ = ["skip", "skip_if", "data", "tag", "stop_patch", "Tag"]
+__all__ = ["skip", "skip_if", "data", "tag", "exclusive", "stop_patch", "Tag"]
 
 
 def skip(reason):
@@ -105,15 +106,28 @@ def tag(*tag_type):
     return wrap
 
 
+def exclusive(cls):
+    """标记修改设备全局状态（恢复出厂、系统初始化、修改超级管理员密码、使用固定名称的测试账号等）的测试类，多进程执行的时候该测试类单独执行，不和其他测试类同时执行
+    @exclusive
+    class TestCheckSystemInitialState(unittest.TestCase):
+        pass
+
+    :param cls: 测试类
+    :return: cls
+    """
+    setattr(cls, CASE_EXCLUSIVE_FLAG, True)
+    return cls
+
+
 def _handler(func):
     @functools.wraps(func)
     def wrap(*args, **kwargs):
-        time.sleep(const.EXECUTE_INTERVAL)
-        msg = "start to test {} ({}/{})".format(getattr(func, CASE_INFO_FLAG),
-                                                getattr(func, CASE_ID_FLAG),
-                                                Tool.total_case_num)
-        log(msg, level='info')
-        result = func(*args, **kwargs)
+        log("start to test %s (%s/%s)", level='info',
+            args=(getattr(func, CASE_INFO_FLAG), getattr(func, CASE_ID_FLAG), Tool.total_case_num))
+        # 测试用例中发送的请求在requestlog中记录测试用例id
+        test_id = args[0].id() if args and isinstance(args[0], unittest.TestCase) else func.__name__
+        with request_context(test=test_id):
+            result = func(*args, **kwargs)
         return result
 
     return wrap
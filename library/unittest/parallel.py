@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# parallel.py - 多进程执行测试用例
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/24 10:20  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    多进程执行TestSuite，由CoreTestRunner在配置WORKERS大于1的时候使用：
+
+    1. 按照测试类分组，同一个测试类的测试方法在同一个worker进程中执行，setUpClass/tearDownClass只执行一次
+    2. 主进程通过pipe把(测试类编号, 测试方法编号列表)发给空闲的worker，worker执行之后把每个测试方法的结果
+       (state, 测试类编号, 测试方法编号, output, exc, run_time)发回主进程，合并到同一个_TestResult中生成报告，
+       output和exc写入主进程的spool
+    3. 每个worker有自己的会话、fixture缓存以及日志文件（日志文件名追加.worker编号）
+    4. 使用@exclusive标记的测试类（恢复出厂、系统初始化等修改设备全局状态的测试类）单独执行：
+       按照原有顺序划分阶段，独占的测试类执行的时候没有其他测试类在执行
+    5. 同一个阶段中的测试类按照历史耗时从长到短分发(LPT)，执行完成之后输出预计和实际的总耗时(makespan)，
+       并更新耗时历史，参见history.py
+
+    worker进程通过fork继承主进程中已经加载的测试用例，不支持fork的平台（Windows）按照顺序执行。
+"""
+import multiprocessing
+import os
+import time
+import unittest
+from collections import OrderedDict, deque
+from multiprocessing.connection import wait
+from unittest.suite import _ErrorHolder
+
+from library.conf import settings
+from library.fixture import fixture_registry
+from library.httpsession import session_pool
+from library.log import log, log_instance
+from library.pacing import pacer
+from library.requestlog import request_sink
+from library.unittest.core import _TestResult
+from library.unittest.history import DurationHistory, lpt_makespan
+from library.unittest.inject import CASE_EXCLUSIVE_FLAG
+
+# worker进程通过fork继承的测试类分组[(测试类, [测试用例, ...]), ...]
+_groups = []
+
+
+def iter_tests(suite):
+    """
+    :param suite: TestSuite
+    :return: 按照执行顺序展开的测试用例
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
+
+
+def group_by_class(suite):
+    """
+    :param suite: TestSuite
+    :return: [(测试类, [测试用例, ...]), ...]，顺序为测试类第一次出现的顺序
+    """
+    groups = OrderedDict()
+    for test in iter_tests(suite):
+        groups.setdefault(test.__class__, []).append(test)
+    return list(groups.items())
+
+
+def is_exclusive(cls):
+    """
+    :param cls: 测试类
+    :return: 测试类是否需要独占执行
+    """
+    return bool(getattr(cls, CASE_EXCLUSIVE_FLAG, False))
+
+
+def plan_phases(groups):
+    """
+    + 说明：
+        按照原有顺序划分执行阶段，连续的普通测试类为一个并发阶段，每个独占的测试类单独为一个阶段
+
+    :param groups: group_by_class的返回值
+    :return: [(是否独占, [测试类编号, ...]), ...]
+    """
+    phases = []
+    current = []
+    for class_id, (cls, _) in enumerate(groups):
+        if is_exclusive(cls):
+            if current:
+                phases.append((False, current))
+                current = []
+            phases.append((True, [class_id]))
+        else:
+            current.append(class_id)
+    if current:
+        phases.append((False, current))
+    return phases
+
+
+class _ResultSender(object):
+    """代替_TestResult.result列表，worker中每个测试用例的结果直接通过pipe发回主进程"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.class_id = None
+        self.indexes = {}
+
+    def append(self, item):
+        state, test, output, exc, run_time = item
+        index = self.indexes.get(id(test), -1)
+        # setUpClass/tearDownClass失败的时候test为_ErrorHolder，主进程根据description重新构造
+        if index < 0:
+            description, run_time = test.description, 0.0
+        else:
+            description = None
+        self.conn.send(('result', state, self.class_id, index, output, exc, run_time, description))
+
+
+def _init_worker(worker_id):
+    """worker进程不复用主进程的会话、登录缓存以及日志文件"""
+    session_pool.invalidate()
+    fixture_registry.invalidate()
+    pacer.reset()
+    log_file = settings.get('log_file') if settings.get('file_log_on') else None
+    if log_file:
+        root, ext = os.path.splitext(str(log_file))
+        log_instance.logfile(f'{root}.worker{worker_id}{ext}', log_level=settings.get('log_level_in_logfile'),
+                             display_to_console=settings.get('console_log_on', True))
+
+
+def _worker(conn, worker_id, verbosity):
+    _init_worker(worker_id)
+    result = _TestResult(verbosity)
+    sender = result.result = _ResultSender(conn)
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        class_id, indexes = job
+        tests = _groups[class_id][1]
+        sender.class_id = class_id
+        sender.indexes = {id(tests[index]): index for index in indexes}
+        result._previousTestClass = None
+        start_timestamp = time.time()
+        unittest.TestSuite(tests[index] for index in indexes)(result)
+        conn.send(('done', class_id, time.time() - start_timestamp))
+    conn.close()
+    # worker进程退出的时候不执行atexit，写完异步日志队列中的日志以及请求记录
+    log_instance.flush()
+    request_sink.flush()
+
+
+class ParallelRunner(object):
+    """
+    + 说明：
+        多进程执行TestSuite，结果合并到传入的_TestResult中
+    """
+
+    def __init__(self, workers, verbosity=1, history=None):
+        """
+        :param workers: worker进程数量
+        :param verbosity: 同_TestResult
+        :param history: DurationHistory，用于LPT调度
+        """
+        self.workers = workers
+        self.verbosity = verbosity
+        self.history = history or DurationHistory()
+        self.groups = []
+        self.class_times = {}  # {测试类: worker中的实际耗时}
+        self.expected_makespan = 0.0
+        self._merged = {}  # {测试类编号: [结果, ...]}
+
+    @staticmethod
+    def available():
+        """
+        :return: 当前平台是否支持fork
+        """
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    def schedule(self, class_ids, workers):
+        """
+        + 说明：
+            按照预计耗时从长到短排列一个阶段中的测试类(LPT)，空闲的worker依次领取，同时累加预计的makespan
+
+        :param class_ids: 阶段中的测试类编号
+        :param workers: 阶段中的worker数量
+        :return: [(测试类编号, (测试方法编号, ...)), ...]
+        """
+        estimates = {class_id: self.history.estimate_class(*self.groups[class_id]) for class_id in class_ids}
+        self.expected_makespan += lpt_makespan(list(estimates.values()), workers)
+        return [(class_id, tuple(range(len(self.groups[class_id][1]))))
+                for class_id in sorted(class_ids, key=lambda class_id: -estimates[class_id])]
+
+    def run(self, test, result):
+        """
+        :param test: TestSuite
+        :param result: _TestResult
+        :return: result
+        """
+        global _groups
+        self.groups = _groups = group_by_class(test)
+        workers = min(self.workers, len(self.groups)) or 1
+        log(f'使用{workers}个worker进程执行{len(self.groups)}个测试类', level='info')
+        context = multiprocessing.get_context('fork')
+        pool = []
+        for worker_id in range(1, workers + 1):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker, args=(child_conn, worker_id, self.verbosity),
+                                      name=f'test-worker-{worker_id}', daemon=True)
+            process.start()
+            child_conn.close()
+            pool.append((parent_conn, process))
+        alive = [conn for conn, _ in pool]
+        try:
+            for exclusive, class_ids in plan_phases(self.groups):
+                workers = alive[:1] if exclusive else list(alive)
+                self._run_phase(self.schedule(class_ids, len(workers)), workers, alive, result)
+        finally:
+            for conn, process in pool:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                process.join(5)
+                if process.is_alive():
+                    process.terminate()
+        # 报告中的顺序同顺序执行
+        merged = [item for class_id in sorted(self._merged) for item in self._merged[class_id]]
+        result.result = [item for item, _ in merged]
+        if result.spool is not None:
+            result.offsets = [offset for _, offset in merged]
+        return result
+
+    def _run_phase(self, jobs, workers, alive, result):
+        pending = deque(jobs)
+        idle = list(reversed(workers))
+        busy = {}
+        while pending or busy:
+            if not idle and not busy:
+                for class_id, _ in pending:
+                    self._merge_error(result, class_id, '没有可用的worker进程')
+                return
+            while pending and idle:
+                conn = idle.pop()
+                job = pending.popleft()
+                conn.send(job)
+                busy[conn] = job
+            for conn in wait(list(busy)):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    class_id, _ = busy.pop(conn)
+                    alive.remove(conn)
+                    self._merge_error(result, class_id, 'worker进程异常退出')
+                    continue
+                if message[0] == 'done':
+                    busy.pop(conn)
+                    idle.append(conn)
+                    self.class_times[self.groups[message[1]][0]] = message[2]
+                else:
+                    self._merge(result, *message[1:])
+
+    def _merge(self, result, state, class_id, index, output, exc, run_time, description):
+        test = self.groups[class_id][1][index] if index >= 0 else _ErrorHolder(description)
+        if state == 0:
+            result.success_count += 1
+        elif state == 1:
+            result.failure_count += 1
+            result.failures.append((test, exc))
+        elif state == 2:
+            result.error_count += 1
+            result.errors.append((test, exc))
+        else:
+            result.skip_count += 1
+            result.skipped.append((test, ''))
+        result.testsRun += 1
+        offset = None
+        if result.spool is not None:  # 输出写入主进程的spool，内存中只保留偏移量
+            offset = result.spool.append(test, output, exc)
+            output = exc = ''
+        self._merged.setdefault(class_id, []).append(((state, test, output, exc, run_time), offset))
+
+    def _merge_error(self, result, class_id, reason):
+        cls = self.groups[class_id][0]
+        log(f'{cls.__module__}.{cls.__qualname__}: {reason}', level='error')
+        self._merge(result, 2, class_id, -1, '', reason, 0.0, f'{reason} ({cls.__module__}.{cls.__qualname__})')
+
+
+def run_suite(test, result, workers, verbosity=1):
+    """
+    + 说明：
+        workers大于1并且平台支持fork的时候多进程执行，否则顺序执行，执行之后更新耗时历史
+
+    :param test: TestSuite
+    :param result: _TestResult
+    :param workers: worker进程数量
+    :param verbosity: 同_TestResult
+    :return: (预计的makespan, 实际的makespan)，单位是秒，没有多进程执行的时候不估算，预计的makespan为None
+    """
+    history = DurationHistory()
+    start_timestamp = time.time()
+    if workers > 1 and ParallelRunner.available():
+        runner = ParallelRunner(workers, verbosity, history)
+        runner.run(test, result)
+        expected, class_times = runner.expected_makespan, runner.class_times
+    else:
+        if workers > 1:
+            log('当前平台不支持fork，测试用例按照顺序执行', level='warning')
+        expected, class_times = None, run_serial(test, result)
+    actual = time.time() - start_timestamp
+    history.record(result.result, class_times)
+    if expected is None:
+        log(f'实际耗时(makespan) {actual:.1f}秒', level='info')
+    else:
+        log(f'预计耗时(makespan) {expected:.1f}秒，实际耗时 {actual:.1f}秒', level='info')
+    return expected, actual
+
+
+def run_serial(test, result):
+    """
+    + 说明：
+        按照原有顺序执行整个TestSuite，setUpModule/tearDownModule与unittest一样每个模块只执行一次；
+        每个测试类的耗时由_TestResult统计，与worker进程相同包括setUpClass/tearDownClass
+
+    :param test: TestSuite
+    :param result: _TestResult
+    :return: {测试类: 实际耗时}
+    """
+    test(result)
+    return result.finish_class_times()
@@ -18,6 +18,7 @@
 #
 # *********************************************************************
 from library.file import ensure_dir
+from library.resultstore import result_store
 from library.unittest.loader import Loader
 from .core import CoreTestRunner
 from ..log import log
@@ -81,5 +82,5 @@ class TestRunner:
         loader.load(discovery)
         ensure_dir(report_file)  # 如果report路径不存执行创建
         CoreTestRunner(report_file=report_file or self.report_file, report_title=report_title or self.report_title). \
-            run(loader.suite)
+            run(result_store.select_tests(loader.suite))
         log("测试完成，请查看报告", level='info', color='blue')
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# spool.py - 测试用例输出的磁盘缓存
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/25 15:10  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    每个测试用例执行完成之后，把输出和异常信息以json lines追加到报告目录下的spool文件，
+    _TestResult中只保留状态、耗时以及在spool文件中的偏移量，生成报告的时候再按照偏移量逐条读取，
+    日志很多的测试不会把所有输出都放在内存中。
+"""
+import json
+import os
+import threading
+
+
+class ReportSpool(object):
+    """
+    + 说明：
+        json lines格式的测试用例输出，每行为{"id": 测试用例id, "output": 输出, "exc": 异常信息}
+    """
+
+    def __init__(self, path, keep=False):
+        """
+        :param path: spool文件路径
+        :param keep: 生成报告之后是否保留spool文件
+        """
+        self.path = path
+        self.keep = keep
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w+b')
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def append(self, test, output, exc):
+        """
+        :param test: 测试用例
+        :param output: 测试用例输出
+        :param exc: 异常信息
+        :return: 记录在spool文件中的偏移量
+        """
+        line = json.dumps({'id': test.id(), 'output': output, 'exc': exc}, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(line.encode('utf-8'))
+            self._dirty = True
+        return offset
+
+    def read(self, offset):
+        """
+        :param offset: append返回的偏移量
+        :return: (输出, 异常信息)
+        """
+        with self._lock:
+            if self._dirty:
+                self._file.flush()
+                self._dirty = False
+            self._file.seek(offset)
+            record = json.loads(self._file.readline().decode('utf-8'))
+        return record['output'], record['exc']
+
+    def close(self):
+        """关闭并删除spool文件（keep为True的时候保留）"""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+        if not self.keep:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -268,7 +268,6 @@ def print_timer(test_case_name, switch, *args, **kwargs):
         display(r'{title} {switch} {time}'.format(title=test_case_name, switch=switch, time=str(current_time)),
                 'TestCase Duration Time:{time}'.format(
                     time=duration(last_time, current_time)) if last_time else ' ', *args, **kwargs)
-    time.sleep(0.5)
 
 
 @contextmanager
@@ -288,13 +287,12 @@ def print_timer_context(test_case_name, *args, **kwargs):
     """
     start_time = datetime.datetime.now()
     try:
-        log(r'{title} {switch} {time}'.format(title=test_case_name, switch='start at', time=str(start_time)),
-            format_print=True, level='info', *args, **kwargs)
+        log(lambda: f'{test_case_name} start at {start_time}', format_print=True, level='info', *args, **kwargs)
         yield 'for doctest use'
     finally:
         stop_time = datetime.datetime.now()
-        log(r'{title} {switch} {time}'.format(title=test_case_name, switch='end at', time=str(stop_time)),
-            'TestCase Duration Time:{time}'.format(time=duration(start_time, stop_time)),
+        log(lambda: f'{test_case_name} end at {stop_time}',
+            lambda: f'TestCase Duration Time:{duration(start_time, stop_time)}',
             format_print=True, level='info', *args, **kwargs)
 
 
@@ -94,6 +94,9 @@ def setup_log():
         backup_count=settings.backup_count,
         logfile_level=settings.log_level_in_logfile,
         display_to_console=settings.console_log_on,
+        async_mode=settings.get('log_async_mode', False),
+        queue_size=settings.get('log_queue_size', 10000),
+        queue_timeout=settings.get('log_queue_timeout', 0.5),
     )
     log('根据项目ini文件重新设置日志默认格式')
 
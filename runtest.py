@@ -17,14 +17,33 @@
 #       - 2018/7/30 16:16  add by wangxinae
 #
 # *********************************************************************
+import argparse
 from pathlib import Path
 
 from library.unittest.runner import TestRunner
 from projectsettings import settings, setup
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='接口自动化测试')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--failed-only', dest='mode', action='store_const', const='failed-only',
+                      help='只执行上一次失败的测试用例（sheet中只执行上一次失败的行）')
+    mode.add_argument('--failed-first', dest='mode', action='store_const', const='failed-first',
+                      help='上一次有失败的测试类先执行')
+    mode.add_argument('--changed-only', dest='mode', action='store_const', const='changed-only',
+                      help='只执行sheet中最近一次通过之后内容或者url发生变化的行')
+    parser.add_argument('--workers', type=int, help='worker进程数，默认读取配置WORKERS')
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
+    args = parse_args()
     setup()
+    if args.mode:
+        settings.set('RERUN_MODE', args.mode)
+    if args.workers:
+        settings.set('WORKERS', args.workers)
     # discovery参数支持如下特性
     # 注意 通过.的方式导入测试用例的时候目前存在缺陷，需要将settings.ini中SORT_CASE=False
     # 支持绝对引入
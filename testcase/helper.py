@@ -29,7 +29,9 @@ except ImportError:
 
 from library.conf import settings
 from library.apitest import Api
+from library.basesheetdata import workbook_cache
 from library.exceptions import FrameNotFound
+from library.log import log
 from library.utils import print_check_case
 
 
@@ -70,6 +72,7 @@ def run():
                 modify_autoincrement(2)
             if func_name == 'tearDownClass':
                 modify_autoincrement(6)
+                log(f'excel缓存统计: {workbook_cache.stats}')
             if isclass(args[0]):
                 # 判断返回的是一个类还是一个实例，对返回是类和实例的情况分别进行处理
                 args[0]().assertTrue(res)
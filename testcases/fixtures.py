@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# *********************************************************************
+# Software : PyCharm
+#
+# fixtures.py
+#
+# Author    :yanwh(yanwh@digitalchina.com)
+#
+# Version 1.0.0
+#
+# Copyright (c) 2004-9999 Digital China Networks Co. Ltd
+#
+#
+# *********************************************************************
+# Change log:
+#       - 2019/2/23 10:10  add by yanwh
+#
+# *********************************************************************
+"""
++ 模块说明：
+    testcases共用的fixture，同一次运行中所有测试类共用超级管理员登录和系统初始化状态查询的结果：
+
+        from testcases.fixtures import fixture_registry
+        ret = fixture_registry.get('super_admin_login')
+
+    修改密码、恢复出厂设置、登出以及通过User().login_common_admin/login_common_user等切换登录用户之后
+    需要调用fixture_registry.notify通知对应的事件（切换登录用户对应EVENT_LOGOUT），下一次get的时候重新登录
+"""
+from api.systeminit import SystemInit
+from api.user import User
+from library.fixture import EVENT_DEVICE_RESET, EVENT_LOGOUT, EVENT_PASSWORD_CHANGED, fixture_registry
+
+
+@fixture_registry.fixture(invalidated_by=(EVENT_PASSWORD_CHANGED, EVENT_DEVICE_RESET, EVENT_LOGOUT),
+                          cache_if=lambda ret: ret.check)
+def super_admin_login():
+    """超级管理员登录，登录失败的结果不缓存"""
+    return User().login_super_admin()
+
+
+@fixture_registry.fixture(depends=('super_admin_login',), invalidated_by=(EVENT_DEVICE_RESET,),
+                          cache_if=lambda ret: ret.check)
+def system_initial_state(login):
+    """系统初始化状态，需要先登录"""
+    return SystemInit().check_system_initial_state()
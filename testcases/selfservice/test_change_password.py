@@ -27,7 +27,9 @@ from api.service import Service
 from api.user import User
 from config import service as service_settings
 from library import private_status_codes as codes
+from library.fixture import EVENT_PASSWORD_CHANGED
 from library.unittest import data, skip
+from testcases.fixtures import fixture_registry
 
 
 class TestChangeUserInfo(unittest.TestCase):
@@ -38,7 +40,7 @@ class TestChangeUserInfo(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """创建普通用户和管理员用户"""
-        cls.assertTrue(cls(), cls.user.login_super_admin())
+        cls.assertTrue(cls(), fixture_registry.get('super_admin_login'))
 
     @classmethod
     def tearDownClass(cls):
@@ -59,6 +61,7 @@ class TestChangeUserInfo(unittest.TestCase):
         """用户修改密码"""
         # 用户登陆退出
         response = self.service.change_password(output=True, json_data=json_data)
+        fixture_registry.notify(EVENT_PASSWORD_CHANGED)
         self.assertEqual(response.status, codes.SUCCESSFUL_OPERATION)
 
 if __name__ == '__main__':
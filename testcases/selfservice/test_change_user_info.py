@@ -25,13 +25,15 @@ from copy import deepcopy
 
 from api.service import Service
 from api.user import User
-from api.systeminit import SystemInit
 from api.utils import make_user_info
 from config import service as service_settings, system_init
 from library import private_status_codes as codes
-from library.unittest import data
+from library.fixture import EVENT_LOGOUT, EVENT_PASSWORD_CHANGED
+from library.unittest import data, exclusive
+from testcases.fixtures import fixture_registry
 
 
+@exclusive
 class TestChangeUserInfo(unittest.TestCase):
     user = User()
     service = Service()
@@ -44,12 +46,11 @@ class TestChangeUserInfo(unittest.TestCase):
         step 2 调用用户查询接口，获取该uid对应的详细账号信息
         step 3 将获取的账号信息转换成change user info接口调用的元数据
         """
-        system = SystemInit()
         inited = system_init.check_system_initial_state.inited
         self = cls()
-        ret = cls.user.login_super_admin()
+        ret = fixture_registry.get('super_admin_login')
         cls.assertTrue(self, ret.check, '超级管理员登陆失败，请检查配置')
-        sys_ret = system.check_system_initial_state()
+        sys_ret = fixture_registry.get('system_initial_state')
         cls.assertTrue(self, sys_ret.check)
         cls.assertEqual(self, sys_ret.response.inited, inited.initialized.value, '设备没有初始化，请初始化')
         cls.meta_user_info = make_user_info(ret.response.result)
@@ -58,18 +59,20 @@ class TestChangeUserInfo(unittest.TestCase):
     def tearDownClass(cls):
         """删除创建用户，执行清理操作"""
         self = cls()
-        ret = cls.user.login_super_admin()
+        ret = fixture_registry.get('super_admin_login')
         cls.assertTrue(self, ret.check, '超级管理员登陆失败，请检查配置')
         ret = cls.service.change_user_info(cls.meta_user_info)
         cls.assertTrue(self, ret.check, '恢复修改超级管理员默认信息失败，请检查接口')
+        fixture_registry.notify(EVENT_PASSWORD_CHANGED)
 
     def setUp(self):
         """每个测试用例开始执行拷贝一份之前构造好的post data"""
         self.json_data = deepcopy(self.meta_user_info)
 
     def tearDown(self):
-        """每个测试用例结束之后恢复post data"""
+        """每个测试用例结束之后恢复post data，修改过的用户信息可能包含密码，登录状态需要重新获取"""
         self.json_data = deepcopy(self.meta_user_info)
+        fixture_registry.notify(EVENT_PASSWORD_CHANGED)
 
     @data('Ywh123456', '!@#!@#!@#!@#!@#', '123', '111111111111111111111111111111',
           '12345678', '111111111111111111111111111111111111111111111111111111111'
@@ -155,6 +158,8 @@ class TestChangeUserInfo(unittest.TestCase):
         self.assertTrue(ret.response.id is not None, '创建普通管理员id为空，创建失败')
         try:
             # 登陆普通管理员账号获取change user info的源数据
+            # 切换了登录用户，缓存的超级管理员登录结果失效
+            fixture_registry.notify(EVENT_LOGOUT)
             self.assertTrue(self.user.login_common_admin().check, '登陆普通管理员账号失败')
             json_data = make_user_info(ret.response.id)
             # 修改接口名称
@@ -177,6 +182,7 @@ class TestChangeUserInfo(unittest.TestCase):
         self.assertTrue(ret.response.id is not None, '创建普通用户id为空，创建失败')
         try:
             # 登陆普通用户号获取change user info的源数据
+            fixture_registry.notify(EVENT_LOGOUT)
             self.assertTrue(self.user.login_common_user().check, '登陆普通用户账号失败')
             json_data = make_user_info(ret.response.id)
             # 修改接口名称
@@ -26,6 +26,8 @@ from api.service import Service
 from api.user import User
 from config import service as service_settings
 from library import private_status_codes as codes
+from library.fixture import EVENT_LOGOUT
+from testcases.fixtures import fixture_registry
 
 
 class TestChangeUserInfo(unittest.TestCase):
@@ -55,6 +57,7 @@ class TestChangeUserInfo(unittest.TestCase):
         """用户未登陆情况下查询用户状态"""
         # 用户登陆退出
         self.user.logout_user()
+        fixture_registry.notify(EVENT_LOGOUT)
         response = self.service.get_login_mode_for_current_user(output=True).to_json()
         self.assertEqual(response.status, codes.SESSION_USER_NOT_FOUND)
 
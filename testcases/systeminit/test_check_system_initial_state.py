@@ -28,6 +28,9 @@ from api.systeminit import SystemInit
 from api.user import User
 from api.device.device import init_device
 from config import system_init
+from library.fixture import EVENT_DEVICE_RESET
+from library.unittest import exclusive
+from testcases.fixtures import fixture_registry
 
 # from library import private_status_codes as codes
 
@@ -35,6 +38,7 @@ interface_status_codes = system_init.check_system_initial_state
 inited = interface_status_codes.inited
 
 
+@exclusive
 class TestCheckSystemInitialState(unittest.TestCase):
     user = User()
     service = Service()
@@ -43,7 +47,7 @@ class TestCheckSystemInitialState(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """超级管理员登陆"""
-        cls.assertTrue(cls(), cls.user.login_super_admin().check)
+        cls.assertTrue(cls(), fixture_registry.get('super_admin_login').check)
         # cls.service.change_password()
 
     @classmethod
@@ -62,6 +66,7 @@ class TestCheckSystemInitialState(unittest.TestCase):
     def test_step_one(self):
         """设备恢复出厂设置,判断设备的初始化状态为未初始化"""
         if init_device():
+            fixture_registry.notify(EVENT_DEVICE_RESET)
             ret = self.system_init.check_system_initial_state(output=True)
             self.assertTrue(ret.check)
             self.assertEqual(ret.response.inited, inited.uninitialized.value)
@@ -72,7 +77,8 @@ class TestCheckSystemInitialState(unittest.TestCase):
         """初始化系统,判断设备的初始化状态为初始化"""
         # 初始化系统
         if init_device():
-            self.assertTrue(self.user.login_super_admin().check)
+            fixture_registry.notify(EVENT_DEVICE_RESET)
+            self.assertTrue(fixture_registry.get('super_admin_login').check)
             ret = self.system_init.check_system_initial_state(output=True)
             self.assertTrue(ret.check)
             self.assertEqual(ret.response.inited, inited.uninitialized.value)
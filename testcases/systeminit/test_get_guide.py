@@ -25,6 +25,7 @@ import unittest
 from api.systeminit import SystemInit
 from api.user import User
 from library import private_status_codes as codes
+from testcases.fixtures import fixture_registry
 
 
 class TestChangeUserInfo(unittest.TestCase):
@@ -33,7 +34,7 @@ class TestChangeUserInfo(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """超级管理员登陆"""
-        cls.assertTrue(cls(), cls.user.login_super_admin().check)
+        cls.assertTrue(cls(), fixture_registry.get('super_admin_login').check)
 
     @classmethod
     def tearDownClass(cls):
@@ -24,9 +24,11 @@ import unittest
 
 from api.systeminit import SystemInit
 from api.user import User
-from library.unittest import data
+from library.unittest import data, exclusive
+from testcases.fixtures import fixture_registry
 
 
+@exclusive
 class TestInitRootOrg(unittest.TestCase):
     """
     初始化根组织机构
@@ -37,7 +39,7 @@ class TestInitRootOrg(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """超级管理员登陆"""
-        cls.assertTrue(cls(), cls.user.login_super_admin().check)
+        cls.assertTrue(cls(), fixture_registry.get('super_admin_login').check)
 
     @classmethod
     def tearDownClass(cls):
@@ -25,15 +25,18 @@ import unittest
 from api.systeminit import SystemInit
 from api.user import User
 from library import private_status_codes as codes
+from library.unittest import exclusive
+from testcases.fixtures import fixture_registry
 
 
+@exclusive
 class TestChangeUserInfo(unittest.TestCase):
     user = User()
     system_init = SystemInit()
     @classmethod
     def setUpClass(cls):
         """超级管理员登陆"""
-        cls.assertTrue(cls(), cls.user.login_super_admin().check)
+        cls.assertTrue(cls(), fixture_registry.get('super_admin_login').check)
 
     @classmethod
     def tearDownClass(cls):
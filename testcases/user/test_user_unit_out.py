@@ -26,19 +26,22 @@ import unittest
 
 from api.user import *
 from config import private_status_codes
+from library.fixture import Provisioner
 from library.log import log_instance
-from library.unittest import data
+from library.unittest import data, exclusive
 
 log_instance.setup(console_level=logging.INFO)
 
 
+@exclusive
 class TestUserUnitOut(unittest.TestCase):
     session = session
+    provisioner = Provisioner(session)
     user_list = []
 
     @classmethod
     def setUpClass(cls):
-        """环境初始化，用管理员账号登陆系统创建2个用户"""
+        """环境初始化，用管理员账号登陆系统逐个创建2个用户，清理的时候批量删除"""
         user_one = {
             "name": "aaaa1",
             "account": "aaaa1",
@@ -67,10 +70,9 @@ class TestUserUnitOut(unittest.TestCase):
 
         self = cls()
         cls.assertTrue(self, super_admin_login(), '管理员登陆失败')
-        for user in (user_one, user_two):
-            _user_id = create_user(json=user)
-            cls.assertGreaterEqual(self, a=_user_id, b=0, msg=f"初始化测试用例环境,创建用户{user['account']}失败")
-            cls.user_list.append((_user_id, user))
+        users = [cls.provisioner.require('user', user) for user in (user_one, user_two)]
+        cls.provisioner.provision()
+        cls.user_list = [(user.id, user.data) for user in users]
 
     def setUp(self):
         """
@@ -92,8 +94,7 @@ class TestUserUnitOut(unittest.TestCase):
         进行会话清理,恢复创建的用户。
         :return:
         """
-        for _user_id, _ in cls.user_list:
-            delete_user(_user_id)
+        cls.provisioner.teardown()
         cls.session.close()
 
     def test_step_one(self):